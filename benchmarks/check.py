@@ -0,0 +1,54 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import sys
+
+import click
+
+from benchmarks.pages import generate_page
+
+
+def check_parser_equivalence(parser, pages=50):
+    """
+    Parse synthetic pages with html.parser and parser, and return the seeds
+    of the pages whose scores differ
+    """
+
+    from ippon.sync import Lequipe
+
+    mismatches = []
+    for seed in range(pages):
+        # Vary the number of competitions, matches and goals
+        content = generate_page(seed, seed % 38 + 1, seed % 4 + 1,
+                                seed % 6 + 1, seed % 5).encode()
+        results = []
+        for backend in ["html.parser", parser]:
+            scores_source = Lequipe("", parser=backend)
+            scores_source.content = content
+            scores_source.date = "20230801"
+            results.append(scores_source.parse())
+        if not results[0] or results[0] != results[1]:
+            mismatches.append(seed)
+    return mismatches
+
+
+@click.command(help="check that a parser backend extracts the same scores as html.parser from synthetic pages")  # noqa: E501
+@click.option("--parser", default="lxml",
+              type=click.Choice(["html.parser", "lxml"]))
+@click.option("--pages", default=50, help="number of pages to check")
+def main(parser, pages):
+
+    from ippon.sync import check_parser
+    if not check_parser(parser):
+        sys.exit(2)
+
+    mismatches = check_parser_equivalence(parser, pages)
+    for seed in mismatches:
+        print(f"[!] page {seed} differs", file=sys.stderr)
+    print(f"[+] {pages} pages checked, {len(mismatches)} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
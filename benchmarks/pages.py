@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from datetime import datetime, timedelta
+import gzip
+import os
+import random
+
+
+COMPETITIONS = ["Ligue 1", "Premier League", "Serie A", "Liga", "Bundesliga",
+                "Ligue 2", "Championship", "Eredivisie"]
+
+CITIES = ["Paris", "Lyon", "Marseille", "Lens", "Lille", "Rennes", "Nice",
+          "Monaco", "Brest", "Nantes", "Reims", "Toulouse", "Montpellier",
+          "Strasbourg", "Lorient", "Metz", "Clermont", "Le Havre", "Auxerre",
+          "Angers", "Bordeaux", "Caen", "Grenoble", "Bastia"]
+PREFIXES = ["", "FC ", "Olympique ", "Stade ", "Racing ", "AS "]
+
+SCORERS = ["Kylian Mbappé", "Olivier Giroud", "Ousmane Dembélé",
+           "Wissam Ben Yedder", "Jonathan David", "Alexandre Lacazette",
+           "Terem Moffi", "Elye Wahi", "Martin Terrier", "Gonçalo Ramos"]
+
+
+def get_competition_names(count):
+    """
+    Return count competition names
+    """
+
+    names = COMPETITIONS[:count]
+    names += [f"Division {chr(ord('A') + i)}"
+              for i in range(count - len(names))]
+    return names
+
+
+def get_teams(competition_index):
+    """
+    Return the teams of a competition, names only use letters
+    """
+
+    random_state = random.Random(competition_index)
+    prefix = PREFIXES[competition_index % len(PREFIXES)]
+    cities = random_state.sample(CITIES, 20)
+    return [f"{prefix}{city}" for city in cities]
+
+
+def generate_goal(random_state):
+    text = f"{random_state.choice(SCORERS)} {random_state.randint(1, 90)}’"
+    if random_state.random() < 0.1:
+        text += f" +{random_state.randint(1, 5)}"
+    if random_state.random() < 0.15:
+        text += " (" + random_state.choice(["pen", "csc"]) + ")"
+    return f'<div class="TeamScore__goal">{text}</div>'
+
+
+def generate_team(side, name, rank):
+    if rank is not None:
+        name = f"{name} ({rank})"
+    logo = name.split(" (")[0].replace(" ", "_")
+    return (f'<div class="MatchScore__team MatchScore__{side}">'
+            f'<div class="MatchScore__teamName">\n    {name}  </div></div>'
+            f'<div class="MatchScore__logo--{side}">'
+            f'<img src="//medias.lequipe.fr/logo/{logo}.png"/></div>')
+
+
+def generate_match(random_state, teams, goals, ranks):
+    """
+    Return the markup of a finished match
+    """
+
+    team1, team2 = random_state.sample(teams, 2)
+    score1 = random_state.randint(0, goals)
+    score2 = random_state.randint(0, goals)
+    rank1 = random_state.randint(1, 20) if ranks else None
+    rank2 = random_state.randint(1, 20) if ranks else None
+
+    goals1 = "".join(generate_goal(random_state) for _ in range(score1))
+    goals2 = "".join(generate_goal(random_state) for _ in range(score2))
+    return ('<div class="TeamScore is-over">'
+            f'<div class="TeamScore__goalList is-home">{goals1}</div>'
+            f'<div class="TeamScore__goalList is-away">{goals2}</div>'
+            + generate_team("home", team1, rank1) +
+            '<div class="MatchScore__result">'
+            f'<div class="MatchScore__score"> {score1} </div>'
+            f'<div class="MatchScore__score">{score2}</div></div>'
+            + generate_team("away", team2, rank2) +
+            '</div>')
+
+
+def generate_page(seed, matchday, competitions=2, matches=5, goals=3):
+    """
+    Return a page in the markup parsed by Lequipe.parse(), with matches
+    finished matches per competition and up to goals goals per team
+    """
+
+    random_state = random.Random(seed)
+    sections = []
+    for i, name in enumerate(get_competition_names(competitions)):
+        teams = get_teams(i)
+        games = "".join(generate_match(random_state, teams, goals, i % 2 == 0)
+                        for _ in range(matches))
+        sections.append('<div class="Lives__compet">'
+                        '<span class="Lives__competTitle">'
+                        f'<h3 class="Lives__title">{name}</h3>'
+                        '<span class="Lives__competNiveau">'
+                        f'{matchday}e journée</span></span>'
+                        f'{games}</div>')
+
+    # Real pages embed the scores between a lot of unrelated markup
+    navigation = "".join(f'<li><a href="/{i}">Rubrique {i}</a></li>'
+                         for i in range(200))
+    return ('<html><head><title>Directs</title>'
+            '<script>var state = {"lives": "<div>"};</script></head>'
+            f'<body><nav><ul>{navigation}</ul></nav>'
+            f'<div class="Lives__section">{"".join(sections)}</div>'
+            '<footer>L\'Équipe</footer></body></html>')
+
+
+def generate_home(home, start, days, competitions=2, matches=5, goals=3):
+    """
+    Write a configuration and days raw pages below home, and return the
+    dates of the pages
+    """
+
+    start = datetime.strptime(start, "%Y%m%d")
+    end = start + timedelta(days=days - 1)
+
+    directory_path = os.path.join(home, ".config", "ippon")
+    os.makedirs(directory_path, exist_ok=True)
+    fd = open(os.path.join(directory_path, "config.ini"), "w")
+    for i, name in enumerate(get_competition_names(competitions)):
+        fd.write(f"[competition.{i}]\n"
+                 f"name = {name}\n"
+                 f"year = {start.year}\n"
+                 f"start = {start.strftime('%d/%m/%Y')}\n"
+                 f"end = {end.strftime('%d/%m/%Y')}\n\n")
+    fd.close()
+
+    dates = []
+    for i in range(days):
+        date = (start + timedelta(days=i)).strftime("%Y%m%d")
+        directory = os.path.join(directory_path, "data", "raw", date[:4])
+        os.makedirs(directory, exist_ok=True)
+        page = generate_page(i, i // 7 + 1, competitions, matches, goals)
+        fd = gzip.open(os.path.join(directory, f"{date}.Football.html.gz"),
+                       "w")
+        fd.write(page.encode())
+        fd.close()
+        dates.append(date)
+    return dates
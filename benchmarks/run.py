@@ -0,0 +1,170 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(function, repeat=1):
+    """
+    Call function repeat times, and return the durations in seconds
+    """
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, \
+             contextlib.redirect_stdout(devnull):
+            function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_benchmarks(dates, jobs, parser, repeat):
+    """
+    Time the build phases on the synthetic home, return a dict of durations
+    """
+
+    # HOME is set by the caller, ippon paths must be computed after that
+    from ippon.config import init_config, StaticConfiguration, \
+        get_config_competitions
+    from ippon.logos import collect_logo_urls, get_logo_filepath
+    from ippon.model import Scores, JSONSource
+    from ippon.snapshot import load_snapshot, SnapshotSource
+    from ippon.sync import Lequipe, convert_dates, aggregate_competitions
+
+    config = init_config(StaticConfiguration.config_file_path)
+    results = {}
+
+    def parse():
+        for date in dates:
+            directory = os.path.join(StaticConfiguration.config_data_raw_directory_path, date[:4])  # noqa: E501
+            scores_source = Lequipe(directory, parser=parser)
+            scores_source.load(date)
+            scores_source.parse()
+    results["parse"] = measure(parse, repeat)
+
+    results["convert"] = measure(lambda: convert_dates(dates, jobs, parser))
+    results["aggregate"] = measure(lambda: aggregate_competitions(config, dates))  # noqa: E501
+    results["aggregate_noop"] = measure(lambda: aggregate_competitions(config, dates), repeat)  # noqa: E501
+
+    # The viewer sources are timed without pyray, as view.load_scores()
+    # does: the snapshot header first, then the displayed competitions
+    names = [c["name"] for c in get_config_competitions(config)]
+
+    def load(get_source, first=False):
+        scores = Scores(names, get_source())
+        for name in scores.keys():
+            for level in scores[name].keys():
+                scores[name][level]
+            if first:
+                break
+
+    def get_snapshot_source():
+        return SnapshotSource(load_snapshot())
+    results["load_first"] = measure(lambda: load(get_snapshot_source, True), repeat)  # noqa: E501
+    results["load_scores"] = measure(lambda: load(get_snapshot_source), repeat)
+    results["load_json"] = measure(lambda: load(JSONSource), repeat)
+
+    def plan_logos():
+        logo_urls = collect_logo_urls(config)
+        return [url for url in logo_urls
+                if not os.path.exists(get_logo_filepath(url))]
+    results["logo_plan"] = measure(plan_logos, repeat)
+
+    return results
+
+
+def get_commit():
+    try:
+        output = subprocess.check_output(["git", "rev-parse", "--short",
+                                          "HEAD"], cwd=REPOSITORY_PATH,
+                                         stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+@click.command(help="benchmark parsing and building on synthetic pages")
+@click.option("--days", default="30,90,180",
+              help="comma separated numbers of days to generate")
+@click.option("--competitions", default=2, help="competitions per day")
+@click.option("--matches", default=5, help="matches per competition")
+@click.option("--goals", default=3, help="maximum goals per team")
+@click.option("--jobs", default=1, help="number of processes for convert")
+@click.option("--parser", default="html.parser",
+              type=click.Choice(["html.parser", "lxml"]))
+@click.option("--repeat", default=3,
+              help="runs of the repeatable benchmarks, the best is kept")
+@click.option("--output", default="-", type=click.File("w"),
+              help="JSON lines output file")
+@click.option("--worker", default=None, hidden=True)
+def main(days, competitions, matches, goals, jobs, parser, repeat, output,
+         worker):
+
+    if worker:
+        # Only time a parser backend that extracts the same scores
+        if parser != "html.parser":
+            from benchmarks.check import check_parser_equivalence
+            if check_parser_equivalence(parser):
+                print(f"[!] {parser} and html.parser results differ",
+                      file=sys.stderr)
+                sys.exit(1)
+
+        # Run in a child process whose HOME is the synthetic home
+        from benchmarks.pages import generate_home
+        dates = generate_home(worker, "20230801", int(days), competitions,
+                              matches, goals)
+        results = run_benchmarks(dates, jobs, parser, repeat)
+        print(json.dumps(results))
+        return
+
+    metadata = {"commit": get_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "parser": parser,
+                "jobs": jobs}
+
+    for count in [int(d) for d in days.split(",")]:
+        with tempfile.TemporaryDirectory(prefix="ippon-bench-") as home:
+            environment = dict(os.environ, HOME=home)
+            command = [sys.executable, "-m", "benchmarks.run",
+                       "--worker", home, "--days", str(count),
+                       "--competitions", str(competitions),
+                       "--matches", str(matches), "--goals", str(goals),
+                       "--jobs", str(jobs), "--parser", parser,
+                       "--repeat", str(repeat)]
+            process = subprocess.run(command, cwd=REPOSITORY_PATH,
+                                     env=environment, stdout=subprocess.PIPE)
+            if process.returncode:
+                print(f"[!] {count} days: benchmark failed", file=sys.stderr)
+                continue
+            results = json.loads(process.stdout.decode().splitlines()[-1])
+
+        for name, durations in results.items():
+            record = {"benchmark": name,
+                      "days": count,
+                      "competitions": competitions,
+                      "matches": count * competitions * matches,
+                      "best": min(durations),
+                      "durations": durations}
+            record.update(metadata)
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            print(f"[+] {name:14s} {count:4d} days {min(durations):8.4f}s",
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,44 +5,129 @@ import click
 
 
 @click.command(help="build scores")
-def build():
+@click.option("--jobs", default=1, help="number of parsing processes")
+@click.option("--parser", default="html.parser",
+              type=click.Choice(["html.parser", "lxml"]))
+@click.option("--sqlite", is_flag=True, help="also update the SQLite store")
+def build(jobs, parser, sqlite):
     from ippon.sync import build_logic
-    build_logic()
+    build_logic(jobs, parser, sqlite)
+
+
+@click.command(help="compare parsers on raw scores")
+@click.option("--parser", default="lxml",
+              type=click.Choice(["html.parser", "lxml"]))
+@click.option("--max", default=-1, help="maximum number of days to check")
+def check(parser, max):
+    from ippon.sync import parser_logic
+    if not parser_logic(parser, max):
+        raise SystemExit(1)
 
 
 @click.command(help="sync scores")
 @click.option("--max", default=-1)
-def sync(max):
+@click.option("--jobs", default=1, help="number of concurrent downloads")
+@click.option("--rate", default=0.0, help="maximum requests per second per host, 0 disables")  # noqa: E501
+@click.option("--archive", is_flag=True,
+              help="store raw scores in the yearly archives")
+def sync(max, jobs, rate, archive):
     from ippon.sync import sync_logic
-    sync_logic(max)
+    sync_logic(max, jobs, rate, archive)
+
+
+@click.command(help="move raw scores to the yearly archives")
+def pack():
+    from ippon.sync import pack_logic
+    pack_logic()
 
 
 @click.command(help="display scores")
-def view():
+@click.option("--sqlite", is_flag=True, help="read scores from the SQLite store")  # noqa: E501
+@click.option("--reload-interval", default=60,
+              help="seconds between data reloads, 0 disables")
+@click.option("--hud", is_flag=True,
+              help="show frame times, toggled with the H key")
+@click.option("--frames", default=0,
+              help="render N frames in a hidden window, and print frame times")  # noqa: E501
+@click.option("--server", default=None,
+              help="read scores from an 'ippon serve' URL")
+def view(sqlite, reload_interval, hud, frames, server):
     from ippon.view import window_logic
-    window_logic()
+    window_logic(sqlite, reload_interval, hud, frames, server)
+
+
+@click.command(help="serve scores and logos over HTTP")
+@click.option("--host", default="0.0.0.0")
+@click.option("--port", default=8080)
+@click.option("--reload-interval", default=10,
+              help="seconds between checks of the competitions files")
+def serve(host, port, reload_interval):
+    from ippon.server import serve_logic
+    serve_logic(host, port, reload_interval)
 
 
 @click.command(help="display scores stats")
 @click.argument("competition", required=False)
-def stats(competition):
+@click.option("--sqlite", is_flag=True, help="read scores from the SQLite store")  # noqa: E501
+@click.option("--json", "as_json", is_flag=True, help="output JSON")
+@click.option("--goals", is_flag=True,
+              help="add goals and scorers analytics, requires numpy")
+@click.option("--top", default=10, help="number of top scorers")
+def stats(competition, sqlite, as_json, goals, top):
     from ippon.stats import main as main_stats
-    main_stats(competition)
+    main_stats(competition, sqlite, as_json, goals, top)
 
 
 @click.command(help="sync logos")
-def logo():
+@click.option("--sqlite", is_flag=True, help="read scores from the SQLite store")  # noqa: E501
+@click.option("--jobs", default=4, help="number of concurrent downloads")
+@click.option("--rate", default=0.0, help="maximum requests per second per host, 0 disables")  # noqa: E501
+@click.option("--normalize", is_flag=True,
+              help="resize the logos that were already downloaded")
+def logo(sqlite, jobs, rate, normalize):
     from ippon.sync import logo_logic
-    logo_logic()
+    logo_logic(sqlite, jobs, rate, normalize)
+
+
+@click.command(help="keep scores and logos up to date")
+@click.option("--jobs", default=1, help="number of concurrent downloads")
+@click.option("--rate", default=0.0, help="maximum requests per second per host, 0 disables")  # noqa: E501
+@click.option("--parser", default="html.parser",
+              type=click.Choice(["html.parser", "lxml"]))
+@click.option("--sqlite", is_flag=True, help="also update the SQLite store")
+@click.option("--interval", default=3600,
+              help="seconds between retrievals of missing dates")
+@click.option("--recent-interval", default=900,
+              help="seconds between refreshes of recent dates")
+@click.option("--recent-days", default=2, help="number of recent dates")
+@click.option("--live-interval", default=120,
+              help="seconds between refreshes of today on match days")
+@click.option("--archive", is_flag=True,
+              help="store raw scores in the yearly archives")
+def daemon(jobs, rate, parser, sqlite, interval, recent_interval,
+           recent_days, live_interval, archive):
+    from ippon.daemon import daemon_logic
+    daemon_logic(jobs, rate, parser, sqlite, interval, recent_interval,
+                 recent_days, live_interval, archive)
 
 
 @click.group()
-def main():
-    pass
+@click.option("--profile", default=None, type=click.Path(dir_okay=False),
+              help="write timings and counters to a JSON report, or to a Prometheus textfile if it ends with .prom")  # noqa: E501
+@click.pass_context
+def main(ctx, profile):
+    if profile:
+        from ippon.profile import enable_profile, write_profile
+        enable_profile()
+        ctx.call_on_close(lambda: write_profile(profile))
 
 
 main.add_command(build)
+main.add_command(check)
+main.add_command(daemon)
 main.add_command(logo)
+main.add_command(pack)
+main.add_command(serve)
 main.add_command(stats)
 main.add_command(sync)
 main.add_command(view)
@@ -0,0 +1,182 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from datetime import datetime
+import os
+
+from ippon.goals import Scorers, normalize_goal, GOAL_PENALTY, GOAL_OWN
+from ippon.records import get_competition_filepath, read_records
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Goal time histogram bins, in minutes
+MINUTES_BINS = [1, 16, 31, 46, 61, 76, 91, 200]
+
+
+def get_season(date, intervals):
+    """
+    Return the season of a match date, from the configured intervals of its
+    competition, or from the year the season started in July
+    """
+
+    for start, end, year in intervals:
+        if start <= date <= end:
+            return year
+    if date[4:6] >= "07":
+        return date[:4]
+    return str(int(date[:4]) - 1)
+
+
+class Goals(object):
+    """
+    Goals of competitions stored as columns, names are kept in tables and
+    columns hold their indexes
+    """
+
+    def __init__(self):
+        self.scorers = Scorers()
+        self.teams = []
+        self.competitions = []
+        self.seasons = []
+        self.columns = {"scorer": [], "minute": [], "stoppage": [],
+                        "type": [], "team": [], "competition": [],
+                        "season": []}
+
+    def get_id(self, table, indexes, value):
+        index = indexes.get(value)
+        if index is None:
+            index = indexes[value] = len(table)
+            table.append(value)
+        return index
+
+    def load(self, competitions):
+        """
+        Load the goals of the configured competitions, and return the
+        columns as NumPy arrays
+        """
+
+        # Seasons of a competition share its file
+        intervals = {}
+        for competition in competitions:
+            start = datetime.strptime(competition["start"], "%d/%m/%Y")
+            end = datetime.strptime(competition["end"], "%d/%m/%Y")
+            intervals.setdefault(competition["name"], []).append(
+                (start.strftime("%Y%m%d"), end.strftime("%Y%m%d"),
+                 competition["year"]))
+
+        indexes = {"teams": {}, "competitions": {}, "seasons": {}}
+        columns = self.columns
+        for name, name_intervals in intervals.items():
+            filepath = get_competition_filepath(name)
+            if not os.path.exists(filepath):
+                continue
+            competition_id = self.get_id(self.competitions,
+                                         indexes["competitions"], name)
+
+            for match in read_records(filepath):
+                season_id = self.get_id(self.seasons, indexes["seasons"],
+                                        get_season(match["date"],
+                                                   name_intervals))
+                for i, team in enumerate(match["teams"]):
+                    team_id = self.get_id(self.teams, indexes["teams"],
+                                          team[f"team{i + 1}"]["name"])
+                    # Records normalized by build, or by older builds
+                    records = team.get("goal_records")
+                    if records is None:
+                        records = [normalize_goal(goal, self.scorers)
+                                   for goal in team["goals"]]
+                    for record in records:
+                        columns["scorer"].append(record["scorer_id"])
+                        columns["minute"].append(record["minute"] or 0)
+                        columns["stoppage"].append(record["added"])
+                        columns["type"].append(record["type"])
+                        columns["team"].append(team_id)
+                        columns["competition"].append(competition_id)
+                        columns["season"].append(season_id)
+
+        dtypes = {"minute": numpy.int16, "stoppage": numpy.int16,
+                  "type": numpy.int8}
+        self.columns = {name: numpy.array(values,
+                                          dtype=dtypes.get(name, numpy.int32))  # noqa: E501
+                        for name, values in columns.items()}
+        return self.columns
+
+    def __len__(self):
+        return len(self.columns["scorer"])
+
+    def get_top_scorers(self, count=10):
+        """
+        Return (scorer, team, goals, penalties) tuples, own goals are not
+        credited to scorers
+        """
+
+        scored = self.columns["type"] != GOAL_OWN
+        scorer = self.columns["scorer"][scored]
+        goals = numpy.bincount(scorer, minlength=len(self.scorers.names))
+        penalties = numpy.bincount(scorer, weights=self.columns["type"][scored] == GOAL_PENALTY,  # noqa: E501
+                                   minlength=len(self.scorers.names))
+
+        # Team of the last goal of each scorer
+        teams = numpy.zeros(len(self.scorers.names), dtype=numpy.int32)
+        teams[scorer] = self.columns["team"][scored]
+
+        top = numpy.lexsort((numpy.arange(len(goals)), -goals))[:count]
+        return [(self.scorers.names[i], self.teams[teams[i]], int(goals[i]),
+                 int(penalties[i]))
+                for i in top if goals[i]]
+
+    def get_minutes_histogram(self):
+        """
+        Return the number of goals per quarter of an hour, and the number
+        of goals scored in stoppage time
+        """
+
+        histogram, _ = numpy.histogram(self.columns["minute"],
+                                       bins=MINUTES_BINS)
+        stoppage = int(numpy.count_nonzero(self.columns["stoppage"]))
+        labels = [f"{MINUTES_BINS[i]}-{MINUTES_BINS[i + 1] - 1}"
+                  for i in range(len(MINUTES_BINS) - 2)]
+        labels.append(f"{MINUTES_BINS[-2]}+")
+        return list(zip(labels, histogram.tolist())), stoppage
+
+    def get_seasons_rates(self):
+        """
+        Return (season, goals, penalty rate, own goal rate) tuples
+        """
+
+        season = self.columns["season"]
+        goals = numpy.bincount(season, minlength=len(self.seasons))
+        penalties = numpy.bincount(season, weights=self.columns["type"] == GOAL_PENALTY,  # noqa: E501
+                                   minlength=len(self.seasons))
+        own_goals = numpy.bincount(season, weights=self.columns["type"] == GOAL_OWN,  # noqa: E501
+                                   minlength=len(self.seasons))
+        total = numpy.maximum(goals, 1)
+        return [(self.seasons[i], int(goals[i]), float(penalties[i] / total[i]),  # noqa: E501
+                 float(own_goals[i] / total[i]))
+                for i in numpy.argsort(self.seasons, kind="stable")]
+
+
+def get_goals_report(competitions, count=10):
+    """
+    Return the goals analytics of competitions, or None without NumPy
+    """
+
+    if numpy is None:
+        return None
+
+    goals = Goals()
+    goals.load(competitions)
+    histogram, stoppage = goals.get_minutes_histogram()
+    return {"goals": len(goals),
+            "top_scorers": [{"scorer": s, "team": t, "goals": g,
+                             "penalties": p}
+                            for s, t, g, p in goals.get_top_scorers(count)],
+            "minutes": dict(histogram),
+            "stoppage_time": stoppage,
+            "seasons": [{"season": s, "goals": g, "penalty_rate": p,
+                         "own_goal_rate": o}
+                        for s, g, p, o in goals.get_seasons_rates()]}
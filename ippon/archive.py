@@ -0,0 +1,280 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import fcntl
+import gzip
+import json
+import mmap
+import os
+import threading
+import zlib
+
+from ippon.config import StaticConfiguration
+from ippon.utils import get_existing_dates
+
+
+# zlib only uses the last 32KB of a preset dictionary
+DICTIONARY_SIZE = 32 * 1024
+
+
+class Archive(object):
+    """
+    An append-only segment storing a year of raw pages, with an offset
+    index and a compression dictionary shared by all pages. Superseded
+    pages are reclaimed by compact()
+    """
+
+    def __init__(self, directory_data, sport):
+        year = os.path.basename(os.path.normpath(directory_data))
+        self.prefix = os.path.join(directory_data, f"{year}.{sport}")
+        self.index_filepath = f"{self.prefix}.idx"
+        self.dictionary_filepath = f"{self.prefix}.dict"
+        # Serializes appends and compactions of all processes
+        self.lock_filepath = f"{self.prefix}.lock"
+        self.lock = threading.Lock()
+        self.index = {}
+        self.index_stamp = None
+        # Incremented each time the segment is compacted
+        self.generation = 0
+        self.pack_filepath = self.get_pack_filepath(0)
+        self.dictionary = None
+        self.mmap = None
+        self.mmap_size = 0
+
+    def get_pack_filepath(self, generation):
+        if generation == 0:
+            return f"{self.prefix}.pack"
+        return f"{self.prefix}.{generation}.pack"
+
+    def _load_index(self):
+        try:
+            stat = os.stat(self.index_filepath)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.index_stamp:
+            return
+
+        fd = open(self.index_filepath)
+        index = json.load(fd)
+        fd.close()
+        self.index_stamp = stamp
+
+        # Indexes written before compaction only hold the pages
+        if "pages" in index:
+            self.index = index["pages"]
+            generation = index["generation"]
+        else:
+            self.index = index
+            generation = 0
+        if generation != self.generation:
+            self.generation = generation
+            self.pack_filepath = self.get_pack_filepath(generation)
+            self._close_mmap()
+
+        if self.dictionary is None:
+            fd = open(self.dictionary_filepath, "rb")
+            self.dictionary = fd.read()
+            fd.close()
+
+    def _write_index(self):
+        tmp_filepath = f"{self.index_filepath}.tmp"
+        tmp_fd = open(tmp_filepath, "w")
+        json.dump({"generation": self.generation, "pages": self.index},
+                  tmp_fd, sort_keys=True)
+        tmp_fd.close()
+        os.replace(tmp_filepath, self.index_filepath)
+
+    def _close_mmap(self):
+        if self.mmap is not None:
+            self.mmap.close()
+        self.mmap = None
+        self.mmap_size = 0
+
+    def _lock_segment(self):
+        fd = open(self.lock_filepath, "a")
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        # Pages appended or compacted by other processes
+        self.index_stamp = None
+        self._load_index()
+        return fd
+
+    def _unlock_segment(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        fd.close()
+
+    def dates(self):
+        with self.lock:
+            self._load_index()
+            return set(self.index)
+
+    def exists(self, date):
+        with self.lock:
+            self._load_index()
+            return date in self.index
+
+    def read(self, date):
+        """
+        Return a raw page, or None
+        """
+
+        with self.lock:
+            self._load_index()
+            if date not in self.index:
+                return None
+            offset, length = self.index[date]
+
+            if self.mmap is None or offset + length > self.mmap_size:
+                self._close_mmap()
+                try:
+                    fd = open(self.pack_filepath, "rb")
+                except FileNotFoundError:
+                    # The segment was compacted since the index was read
+                    self.index_stamp = None
+                    self._load_index()
+                    if date not in self.index:
+                        return None
+                    offset, length = self.index[date]
+                    fd = open(self.pack_filepath, "rb")
+                self.mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)  # noqa: E501
+                self.mmap_size = len(self.mmap)
+                fd.close()
+            data = self.mmap[offset:offset + length]
+
+        decompressor = zlib.decompressobj(zdict=self.dictionary)
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def append(self, date, content):
+        """
+        Append a raw page, and point the index to it
+        """
+
+        with self.lock:
+            lock_fd = self._lock_segment()
+            try:
+                if self.dictionary is None:
+                    # The first page seeds the dictionary of the segment
+                    self.dictionary = content[:DICTIONARY_SIZE]
+                    tmp_filepath = f"{self.dictionary_filepath}.tmp"
+                    tmp_fd = open(tmp_filepath, "wb")
+                    tmp_fd.write(self.dictionary)
+                    tmp_fd.close()
+                    os.replace(tmp_filepath, self.dictionary_filepath)
+
+                compressor = zlib.compressobj(9, zdict=self.dictionary)
+                data = compressor.compress(content) + compressor.flush()
+
+                fd = open(self.pack_filepath, "ab")
+                fd.seek(0, os.SEEK_END)
+                offset = fd.tell()
+                fd.write(data)
+                fd.flush()
+                os.fsync(fd.fileno())
+                fd.close()
+
+                self.index[date] = [offset, len(data)]
+                self._write_index()
+            finally:
+                self._unlock_segment(lock_fd)
+
+    def compact(self):
+        """
+        Rewrite the segment with the pages of the index only, and return the
+        number of bytes reclaimed
+        """
+
+        with self.lock:
+            lock_fd = self._lock_segment()
+            try:
+                try:
+                    size = os.path.getsize(self.pack_filepath)
+                except FileNotFoundError:
+                    return 0
+                if size <= sum(length for _, length in self.index.values()):
+                    return 0
+
+                # The new index points to a new segment, so that readers
+                # never see offsets of the other one
+                pack_filepath = self.get_pack_filepath(self.generation + 1)
+                index = {}
+                fd = open(self.pack_filepath, "rb")
+                new_fd = open(pack_filepath, "wb")
+                for date, (offset, length) in sorted(self.index.items(),
+                                                     key=lambda i: i[1][0]):
+                    fd.seek(offset)
+                    index[date] = [new_fd.tell(), length]
+                    new_fd.write(fd.read(length))
+                new_fd.flush()
+                os.fsync(new_fd.fileno())
+                new_size = new_fd.tell()
+                new_fd.close()
+                fd.close()
+
+                previous_filepath = self.pack_filepath
+                self.index = index
+                self.generation += 1
+                self.pack_filepath = pack_filepath
+                self._write_index()
+                self._close_mmap()
+                os.remove(previous_filepath)
+            finally:
+                self._unlock_segment(lock_fd)
+        return size - new_size
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(directory_data, sport):
+    """
+    Return the archive of a year directory, shared by all threads
+    """
+
+    key = (os.path.normpath(directory_data), sport)
+    with _archives_lock:
+        if key not in _archives:
+            _archives[key] = Archive(directory_data, sport)
+        return _archives[key]
+
+
+def get_retrieved_dates(sport="Football"):
+    """
+    Return the dates whose raw scores were retrieved, as files or in
+    archives
+    """
+
+    directory_path = StaticConfiguration.config_data_raw_directory_path
+    dates = get_existing_dates(directory_path, f".{sport}.html.gz")
+    if not os.path.exists(directory_path):
+        return dates
+    for year in os.listdir(directory_path):
+        directory = os.path.join(directory_path, year)
+        index_filepath = os.path.join(directory, f"{year}.{sport}.idx")
+        if os.path.exists(index_filepath):
+            dates.update(get_archive(directory, sport).dates())
+    return dates
+
+
+def pack_directory(directory_data, sport="Football", exclude=()):
+    """
+    Move the raw pages files of a year directory to its archive, except the
+    excluded dates, then compact it. Return the number of pages moved and
+    the number of bytes reclaimed
+    """
+
+    archive = get_archive(directory_data, sport)
+    suffix = f".{sport}.html.gz"
+    filenames = sorted(f for f in os.listdir(directory_data)
+                       if f.endswith(suffix)
+                       and f[:-len(suffix)] not in exclude)
+
+    for filename in filenames:
+        filepath = os.path.join(directory_data, filename)
+        fd = gzip.open(filepath, "r")
+        content = fd.read()
+        fd.close()
+        archive.append(filename[:-len(suffix)], content)
+        os.remove(filepath)
+
+    return len(filenames), archive.compact()
@@ -13,7 +13,13 @@ class StaticConfiguration(object):
     _config_data_json_directory_name = "json"
     _config_competitions_directory_name = "competitions"
     _config_logos_directory_name = "logos"
+    _config_atlas_directory_name = "atlas"
     _config_relative_filename = "config.ini"
+    _config_manifest_filename = "manifest.json"
+    _config_database_filename = "scores.sqlite"
+    _config_snapshot_filename = "snapshot.bin"
+    _config_journal_filename = "sync.journal"
+    _config_scorers_filename = "scorers.json"
 
     # Prepend the configuration directory path with the user home directory
     config_directory_path = os.path.join(os.path.expanduser("~"),
@@ -26,10 +32,22 @@ class StaticConfiguration(object):
                                                   _config_data_raw_directory_name)  # noqa: E501
     config_data_json_directory_path = os.path.join(config_data_directory_path,
                                                    _config_data_json_directory_name)  # noqa: E501
+    config_manifest_file_path = os.path.join(config_data_directory_path,
+                                             _config_manifest_filename)
+    config_database_file_path = os.path.join(config_data_directory_path,
+                                             _config_database_filename)
+    config_journal_file_path = os.path.join(config_data_directory_path,
+                                            _config_journal_filename)
+    config_scorers_file_path = os.path.join(config_data_directory_path,
+                                            _config_scorers_filename)
     config_competitions_directory_path = os.path.join(config_directory_path,
                                                       _config_competitions_directory_name)  # noqa: E501
+    config_snapshot_file_path = os.path.join(config_directory_path,
+                                             _config_snapshot_filename)
     config_logos_directory_path = os.path.join(config_directory_path,
                                                _config_logos_directory_name)  # noqa: E501
+    config_atlas_directory_path = os.path.join(config_logos_directory_path,
+                                               _config_atlas_directory_name)  # noqa: E501
 
 
 def generate_directory_structure():
@@ -42,7 +60,8 @@ def generate_directory_structure():
                       StaticConfiguration.config_data_raw_directory_path,
                       StaticConfiguration.config_data_json_directory_path,
                       StaticConfiguration.config_competitions_directory_path,
-                      StaticConfiguration.config_logos_directory_path]:
+                      StaticConfiguration.config_logos_directory_path,
+                      StaticConfiguration.config_atlas_directory_path]:
         if not os.path.exists(directory):
             os.makedirs(directory)
 
@@ -56,7 +75,8 @@ def generate_directory_competitions_structure(competition):
     year_start = date_start.split("/")[2]
     year_end = date_end.split("/")[2]
 
-    for year in set([year_start, year_end]):
+    for year in range(int(year_start), int(year_end) + 1):
+        year = str(year)
         # Create data directories
         for directory in [StaticConfiguration.config_data_raw_directory_path,
                           StaticConfiguration.config_data_json_directory_path]:
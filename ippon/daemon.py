@@ -0,0 +1,187 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from datetime import datetime, timedelta
+import os
+import requests
+import sqlite3
+import sys
+import time
+import zlib
+
+from ippon.archive import get_retrieved_dates, pack_directory
+from ippon.config import init_config, StaticConfiguration
+from ippon.fetch import FetchEngine
+from ippon.manifest import get_file_stamp
+from ippon.store import update_store
+from ippon.sync import Lequipe, retrieve_dates, check_parser, \
+    convert_dates, aggregate_competitions, sync_logos
+from ippon.utils import get_planned_dates
+
+
+class Daemon(object):
+    """
+    Run sync, build and logo incrementally, with a warm configuration,
+    directory index and HTTP session
+    """
+
+    def __init__(self, jobs=1, rate=None, parser="html.parser", sqlite=False,
+                 interval=3600, recent_interval=900, recent_days=2,
+                 live_interval=120, archive=False):
+        self.jobs = jobs
+        self.archive = archive
+        self.parser = parser
+        self.sqlite = sqlite
+        self.interval = interval
+        self.recent_interval = recent_interval
+        self.recent_days = recent_days
+        self.live_interval = live_interval
+
+        self.engine = FetchEngine(jobs, rate, Lequipe.headers)
+        self.config = None
+        self.config_stamp = None
+        self.dates_retrieved = set()
+        # Retrieved dates that were not built yet
+        self.dates_pending = set()
+        # Monotonic time of the next run of each schedule
+        self.next_run = {"historical": 0, "recent": 0, "live": 0}
+
+    def load_config(self):
+        """
+        Load the configuration when it changed, and index retrieved dates
+        """
+
+        stamp = get_file_stamp(StaticConfiguration.config_file_path)
+        if self.config is not None and stamp == self.config_stamp:
+            return
+
+        self.config = init_config(StaticConfiguration.config_file_path)
+        self.config_stamp = stamp
+        self.dates_retrieved = get_retrieved_dates()
+
+    def is_match_day(self, date):
+        """
+        Return True if the scores sections of the last retrieved page of
+        date list a configured competition
+        """
+
+        directory = os.path.join(StaticConfiguration.config_data_raw_directory_path, date[:4])  # noqa: E501
+        scores_source = Lequipe(directory, parser=self.parser)
+        scores_source.load(date)
+        if scores_source.content is None:
+            return True
+        names = set(self.config[section]["name"]
+                    for section in self.config.sections())
+        return bool(names & scores_source.get_competitions_names())
+
+    def pack(self, dates_window):
+        """
+        Move the pages that left the refresh window to the archives
+        """
+
+        directory_path = StaticConfiguration.config_data_raw_directory_path
+        if not os.path.exists(directory_path):
+            return
+        for year in sorted(os.listdir(directory_path)):
+            directory = os.path.join(directory_path, year)
+            if year.isdigit() and os.path.isdir(directory):
+                pack_directory(directory, exclude=dates_window)
+
+    def run_cycle(self, now):
+        """
+        Run the schedules that are due, and return the dates retrieved
+        """
+
+        self.load_config()
+        dates_needed = get_planned_dates(self.config)
+        today = datetime.today().strftime("%Y%m%d")
+        # Dates whose results may still change are kept as files, the
+        # archives only store pages that are not refreshed anymore
+        dates_window = set((datetime.today() - timedelta(days=i)).strftime("%Y%m%d")  # noqa: E501
+                           for i in range(self.recent_days + 1))
+
+        # Dates that were never retrieved
+        dates_missing = []
+        if now >= self.next_run["historical"]:
+            self.next_run["historical"] = now + self.interval
+            dates_missing = [d for d in dates_needed
+                             if d not in self.dates_retrieved and d != today]
+            if self.archive:
+                self.pack(dates_window)
+
+        # Recent dates whose results may still change
+        dates_refresh = set()
+        if now >= self.next_run["recent"]:
+            self.next_run["recent"] = now + self.recent_interval
+            dates_refresh.update(dates_window - {today})
+        if now >= self.next_run["live"]:
+            self.next_run["live"] = now + self.live_interval
+            if self.is_match_day(today):
+                dates_refresh.add(today)
+            else:
+                # Quiet day, check it again with the recent dates
+                self.next_run["live"] = now + self.recent_interval
+        dates_refresh = sorted(dates_refresh.intersection(dates_needed))
+
+        dates_retrieved = retrieve_dates(self.engine,
+                                         [d for d in dates_missing
+                                          if d not in dates_window],
+                                         archive=self.archive)
+        dates_retrieved += retrieve_dates(self.engine,
+                                          [d for d in dates_missing
+                                           if d in dates_window])
+        dates_retrieved += retrieve_dates(self.engine, dates_refresh,
+                                          force=True)
+        self.dates_retrieved.update(dates_retrieved)
+        self.dates_pending.update(dates_retrieved)
+        if not self.dates_pending:
+            return dates_retrieved
+
+        convert_dates(sorted(self.dates_pending), self.jobs, self.parser)
+        aggregate_competitions(self.config, dates_needed)
+        if self.sqlite:
+            update_store(dates_needed)
+        self.dates_pending.clear()
+        sync_logos(self.config, self.engine, self.sqlite)
+
+        return dates_retrieved
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            try:
+                self.load_config()
+            except FileNotFoundError:
+                print(f"{StaticConfiguration.config_file_path} not found!",
+                      file=sys.stderr)
+                return
+
+            # A failed cycle is retried by the next schedule, pending dates
+            # are built again
+            try:
+                self.run_cycle(now)
+            except (OSError, EOFError, ValueError, zlib.error, sqlite3.Error,
+                    requests.RequestException) as e:
+                print(f"[!] cycle failed: {e}", file=sys.stderr)
+
+            delay = min(self.next_run.values()) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def daemon_logic(jobs=1, rate=None, parser="html.parser", sqlite=False,
+                 interval=3600, recent_interval=900, recent_days=2,
+                 live_interval=120, archive=False):
+    """
+    Keep the scores up to date
+    """
+
+    if not check_parser(parser):
+        return
+
+    daemon = Daemon(jobs, rate, parser, sqlite, interval, recent_interval,
+                    recent_days, live_interval, archive)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ippon.profile import count
+
+
+# Retries of throttled or failed requests, and their delays in seconds
+FETCH_RETRIES = 3
+FETCH_TIMEOUT = 30
+BACKOFF_BASE = 2
+BACKOFF_MAX = 120
+
+# Concurrency is lowered when the latency exceeds the best one by this factor
+LATENCY_FACTOR = 3
+
+
+class FetchError(requests.RequestException):
+    """
+    A response that must not be stored
+    """
+
+
+def get_session(jobs=1, headers=None):
+    """
+    Return a requests session with a connection pool sized for jobs workers
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(jobs, 1),
+                          pool_maxsize=max(jobs, 1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+class RateLimiter(object):
+    """
+    Space out requests sent to the same host
+    """
+
+    def __init__(self, rate):
+        # rate is the maximum number of requests per second and per host
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        if not self.interval:
+            return
+
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AdaptiveController(object):
+    """
+    Keep the number of concurrent requests between 1 and maximum: halve it
+    on throttling and errors, lower it when the latency increases, and
+    raise it after a window of fast answers
+    """
+
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = maximum
+        self.active = 0
+        self.condition = threading.Condition()
+        self.latency = None
+        self.best_latency = None
+        self.window = 0
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, latency=None, failed=False):
+        with self.condition:
+            self.active -= 1
+            if failed:
+                self.limit = max(1, self.limit // 2)
+                self.window = 0
+            else:
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency = 0.8 * self.latency + 0.2 * latency
+                if self.best_latency is None or latency < self.best_latency:
+                    self.best_latency = latency
+
+                # Adjust once per window of limit answers
+                self.window += 1
+                if self.window >= self.limit:
+                    self.window = 0
+                    if self.latency > LATENCY_FACTOR * self.best_latency:
+                        self.limit = max(1, self.limit - 1)
+                    else:
+                        self.limit = min(self.maximum, self.limit + 1)
+            self.condition.notify_all()
+
+
+def get_backoff(attempt, retry_after=None):
+    """
+    Return the delay before retrying, honoring the Retry-After header
+    """
+
+    if retry_after and retry_after.isdigit():
+        return min(BACKOFF_MAX, int(retry_after))
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+class FetchEngine(object):
+    """
+    Run fetch tasks with a bounded pool of threads sharing one session
+    """
+
+    errors = requests.RequestException
+
+    def __init__(self, jobs=1, rate=None, headers=None,
+                 retries=FETCH_RETRIES):
+        self.jobs = max(jobs, 1)
+        self.session = get_session(self.jobs, headers)
+        self.limiter = RateLimiter(rate)
+        self.controller = AdaptiveController(self.jobs)
+        self.retries = retries
+
+    def get(self, url, **kwargs):
+        """
+        Send a GET request, and retry it with a backoff when it fails or
+        when the server is throttled or unavailable
+        """
+
+        kwargs.setdefault("timeout", FETCH_TIMEOUT)
+        for attempt in range(self.retries + 1):
+            self.controller.acquire()
+            self.limiter.wait(url)
+            start = time.monotonic()
+            try:
+                r = self.session.get(url, **kwargs)
+            except requests.RequestException:
+                self.controller.release(failed=True)
+                if attempt == self.retries:
+                    raise
+                count("fetch.retries")
+                time.sleep(get_backoff(attempt))
+                continue
+
+            failed = r.status_code == 429 or r.status_code >= 500
+            self.controller.release(time.monotonic() - start, failed)
+            if not failed or attempt == self.retries:
+                return r
+            count("fetch.retries")
+            count("fetch.throttled")
+            time.sleep(get_backoff(attempt, r.headers.get("Retry-After")))
+
+    def run(self, function, items):
+        """
+        Call function on each item, and yield (item, result) when done
+        """
+
+        if self.jobs == 1:
+            for item in items:
+                yield item, function(item)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {executor.submit(function, item): item
+                       for item in items}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
@@ -0,0 +1,89 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from collections import deque
+import time
+
+
+# Parts of a frame, present includes waiting for the target FPS
+FRAME_PHASES = ("lookup", "text", "texture", "gui", "present")
+WORK_PHASES = FRAME_PHASES[:-1]
+
+
+def get_percentile(values, percentile):
+    """
+    Return the nearest-rank percentile of sorted values
+    """
+
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1,
+                       int(round(percentile / 100 * len(values))) - 1))
+    return values[index]
+
+
+class FrameTimer(object):
+    """
+    Split frame times into phases, and keep the worst frame of each
+    window of frames
+    """
+
+    def __init__(self, window=10, history=30, keep_all=False):
+        self.window = window
+        self.frame = None
+        self.last = None
+        # Worst frames of the last windows, as (work, phases) tuples
+        self.worst = deque(maxlen=history)
+        self.window_worst = None
+        self.window_frames = 0
+        self.previous = None
+        # All frames are kept when percentiles are needed
+        self.frames = [] if keep_all else None
+
+    def begin(self):
+        self.frame = dict.fromkeys(FRAME_PHASES, 0.0)
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        """
+        Add the time spent since the previous mark to phase
+        """
+
+        now = time.perf_counter()
+        self.frame[phase] += now - self.last
+        self.last = now
+
+    def end(self):
+        self.mark("present")
+        work = sum(self.frame[p] for p in WORK_PHASES)
+        frame = (work, self.frame)
+        self.previous = frame
+        if self.frames is not None:
+            self.frames.append(frame)
+
+        if self.window_worst is None or work > self.window_worst[0]:
+            self.window_worst = frame
+        self.window_frames += 1
+        if self.window_frames >= self.window:
+            self.worst.append(self.window_worst)
+            self.window_worst = None
+            self.window_frames = 0
+
+    def report(self):
+        """
+        Return percentiles of the kept frames, in milliseconds
+        """
+
+        frames = self.frames or []
+        series = {"work": [f[0] for f in frames],
+                  "frame": [f[0] + f[1]["present"] for f in frames]}
+        for phase in FRAME_PHASES:
+            series[phase] = [f[1][phase] for f in frames]
+
+        report = {"frames": len(frames)}
+        for name, values in series.items():
+            values.sort()
+            report[name] = {f"p{p}": get_percentile(values, p) * 1000
+                            for p in (50, 90, 99)}
+            report[name]["max"] = values[-1] * 1000 if values else 0.0
+        return report
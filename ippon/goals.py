@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import json
+import os
+import re
+
+from ippon.config import StaticConfiguration
+
+
+GOAL_MINUTE_RE = re.compile(r"(\d+)’(?:\s*\+(\d+))?")
+
+# Goal types
+GOAL_REGULAR = 0
+GOAL_PENALTY = 1
+GOAL_OWN = 2
+GOAL_OTHER = 3
+GOAL_TYPES = {None: GOAL_REGULAR, "pen": GOAL_PENALTY, "csc": GOAL_OWN}
+
+
+def get_goal_label(scorer, goal_time, goal_type):
+    """
+    Return the text displayed for a goal
+    """
+
+    label = scorer
+    if goal_time:
+        label += " " + goal_time.replace("’", "'")
+    if goal_type:
+        label += " " + goal_type
+    return label
+
+
+def get_goals_labels(team):
+    """
+    Return the labels of the goals of a team, as prerendered by build when
+    available
+    """
+
+    records = team.get("goal_records")
+    if records is not None:
+        return tuple(record["label"] for record in records)
+    return tuple(get_goal_label(*goal) for goal in team["goals"])
+
+
+class Scorers(object):
+    """
+    Stable identifiers of the scorers names, shared by all competitions
+    """
+
+    def __init__(self, filepath=None):
+        if filepath is None:
+            filepath = StaticConfiguration.config_scorers_file_path
+        self.filepath = filepath
+        try:
+            fd = open(filepath)
+            self.names = json.load(fd)
+            fd.close()
+        except (FileNotFoundError, ValueError):
+            self.names = []
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.changed = False
+
+    def get_id(self, name):
+        scorer_id = self.ids.get(name)
+        if scorer_id is None:
+            scorer_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.changed = True
+        return scorer_id
+
+    def save(self):
+        if not self.changed:
+            return
+        tmp_filepath = f"{self.filepath}.tmp"
+        fd = open(tmp_filepath, "w")
+        json.dump(self.names, fd)
+        fd.close()
+        os.replace(tmp_filepath, self.filepath)
+        self.changed = False
+
+
+def normalize_goal(goal, scorers):
+    """
+    Return a goal as a record with an integer minute and added time, a
+    type identifier, a scorer identifier and its label
+    """
+
+    scorer, goal_time, goal_type = goal
+    m = GOAL_MINUTE_RE.search(goal_time or "")
+    return {"scorer_id": scorers.get_id(scorer.strip()),
+            "minute": int(m.group(1)) if m else None,
+            "added": int(m.group(2)) if m and m.group(2) else 0,
+            "type": GOAL_TYPES.get(goal_type, GOAL_OTHER),
+            "label": get_goal_label(scorer, goal_time, goal_type)}
+
+
+def normalize_match(match, scorers):
+    """
+    Return a copy of a match whose teams include normalized goal records
+    """
+
+    teams = [dict(team, goal_records=[normalize_goal(goal, scorers)
+                                      for goal in team["goals"]])
+             for team in match["teams"]]
+    return dict(match, teams=teams)
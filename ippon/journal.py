@@ -0,0 +1,89 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import json
+import os
+import threading
+
+from ippon.config import StaticConfiguration
+
+
+# Dates failing this many times are left to the next plan
+JOURNAL_ATTEMPTS = 3
+
+
+class Journal(object):
+    """
+    Append-only log of a backfill: its planned dates, then the outcome of
+    each retrieval, so that an interrupted sync resumes where it stopped
+    """
+
+    def __init__(self, filepath=None):
+        if filepath is None:
+            filepath = StaticConfiguration.config_journal_file_path
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.plan = []
+        self.done = set()
+        self.failures = {}
+        self.load()
+
+    def load(self):
+        try:
+            fd = open(self.filepath)
+        except FileNotFoundError:
+            return
+
+        for line in fd:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line may be truncated by an interruption
+                continue
+            if "plan" in entry:
+                self.plan = entry["plan"]
+                self.done = set()
+                self.failures = {}
+            elif entry.get("error"):
+                date = entry["date"]
+                self.failures[date] = self.failures.get(date, 0) + 1
+            else:
+                self.done.add(entry["date"])
+        fd.close()
+
+    def pending(self):
+        """
+        Return the planned dates that are neither retrieved nor given up
+        """
+
+        return [d for d in self.plan if d not in self.done
+                and self.failures.get(d, 0) < JOURNAL_ATTEMPTS]
+
+    def _write(self, entry, mode="a"):
+        fd = open(self.filepath, mode)
+        fd.write(json.dumps(entry) + "\n")
+        fd.flush()
+        os.fsync(fd.fileno())
+        fd.close()
+
+    def start(self, dates):
+        with self.lock:
+            self.plan = list(dates)
+            self.done = set()
+            self.failures = {}
+            self._write({"plan": self.plan}, "w")
+
+    def record(self, date, error=None):
+        with self.lock:
+            if error:
+                self.failures[date] = self.failures.get(date, 0) + 1
+                self._write({"date": date, "error": error})
+            else:
+                self.done.add(date)
+                self._write({"date": date})
+
+    def finish(self):
+        with self.lock:
+            self.plan = []
+            if os.path.exists(self.filepath):
+                os.remove(self.filepath)
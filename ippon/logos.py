@@ -0,0 +1,292 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+from ippon.config import StaticConfiguration, get_config_competitions
+from ippon.manifest import load_manifest, locked_manifest, get_file_stamp
+from ippon.profile import span, count
+from ippon.records import get_competition_filepath, read_records
+from ippon.store import open_store, get_logo_urls
+
+
+# Logos are drawn next to 30 pixels high team names
+LOGO_SIZE = 30
+
+# Size of the images packing the logos
+ATLAS_SIZE = 1024
+ATLAS_INDEX_FILENAME = "atlas.json"
+
+# Delay before downloading a logo that failed again, doubled after each
+# failure
+LOGO_RETRY_DELAY = 3600
+LOGO_RETRY_MAX_DELAY = 7 * 24 * 3600
+
+
+def get_logo_filename(logo_url):
+    return hashlib.md5(logo_url.encode()).hexdigest() + ".png"
+
+
+def get_logo_filepath(logo_url):
+    return os.path.join(StaticConfiguration.config_logos_directory_path,
+                        get_logo_filename(logo_url))
+
+
+def collect_logo_urls(config, sqlite=False):
+    """
+    Return the unique logos URL of the teams of all competitions
+    """
+
+    connection = open_store() if sqlite else None
+
+    logo_urls = set()
+    competitions = get_config_competitions(config)
+    for competition in competitions:
+        name = competition["name"]
+        if connection:
+            logo_urls.update(get_logo_urls(connection, [name]))
+            continue
+
+        competition_filepath = get_competition_filepath(name)
+        if not os.path.exists(competition_filepath):
+            continue
+        for match in read_records(competition_filepath):
+            logo_urls.add(match["teams"][0]["team1"]["logo"])
+            logo_urls.add(match["teams"][1]["team2"]["logo"])
+
+    if connection:
+        connection.close()
+
+    return logo_urls
+
+
+def normalize_logo(data, logo_filepath):
+    """
+    Resize a logo to fit LOGO_SIZE, and save it as PNG
+    """
+
+    try:
+        import pyray
+    except ImportError:
+        pyray = None
+
+    tmp_filepath = f"{logo_filepath}.tmp.png"
+    if pyray is None:
+        fd = open(tmp_filepath, "wb")
+        fd.write(data)
+        fd.close()
+        os.replace(tmp_filepath, logo_filepath)
+        return True
+
+    pyray.set_trace_log_level(pyray.LOG_NONE)
+    image = pyray.load_image_from_memory(".png", data, len(data))
+    if not image.width or not image.height:
+        pyray.unload_image(image)
+        return False
+
+    scale = LOGO_SIZE / max(image.width, image.height)
+    if scale < 1:
+        pyray.image_resize(image, max(1, round(image.width * scale)),
+                           max(1, round(image.height * scale)))
+    exported = pyray.export_image(image, tmp_filepath)
+    pyray.unload_image(image)
+    if not exported:
+        return False
+    os.replace(tmp_filepath, logo_filepath)
+    return True
+
+
+def download_logos(engine, logo_urls):
+    """
+    Download and normalize the logos that are missing, and return their
+    number
+    """
+
+    missing_urls = [url for url in sorted(logo_urls)
+                    if not os.path.exists(get_logo_filepath(url))]
+    count("logo.cache_hits", len(logo_urls) - len(missing_urls))
+
+    # Logos that failed are only requested again after their retry time
+    now = time.time()
+    failures = load_manifest().get("logo_failures", {})
+    missing_urls = [url for url in missing_urls
+                    if failures.get(url, {}).get("retry", 0) <= now]
+
+    def download(logo_url):
+        print(f"  [+] Downloading {logo_url}")
+        try:
+            with span("logo.fetch"):
+                r = engine.get(logo_url)
+        except engine.errors as e:
+            print(f"  [!] {logo_url}: {e}", file=sys.stderr)
+            return False
+        if r.status_code != 200:
+            print(f"  [!] {logo_url}: HTTP {r.status_code}", file=sys.stderr)
+            return False
+        count("logo.bytes", len(r.content))
+        with span("logo.normalize"):
+            normalized = normalize_logo(r.content, get_logo_filepath(logo_url))  # noqa: E501
+        if not normalized:
+            print(f"  [!] {logo_url}: invalid image", file=sys.stderr)
+            return False
+        return True
+
+    results = list(engine.run(download, missing_urls))
+    record_logo_failures(results)
+    downloaded = sum(1 for _, downloaded in results if downloaded)
+    count("logo.downloaded", downloaded)
+    return downloaded
+
+
+def record_logo_failures(results):
+    """
+    Store the retry time of the logos that could not be downloaded, and
+    forget the ones that were
+    """
+
+    if not results:
+        return
+
+    now = time.time()
+    with locked_manifest() as manifest:
+        failures = manifest.setdefault("logo_failures", {})
+        for logo_url, downloaded in results:
+            if downloaded:
+                failures.pop(logo_url, None)
+                continue
+            failed = failures.get(logo_url, {}).get("count", 0) + 1
+            delay = min(LOGO_RETRY_DELAY * 2 ** (failed - 1), LOGO_RETRY_MAX_DELAY)  # noqa: E501
+            failures[logo_url] = {"count": failed, "retry": now + delay}
+
+
+def normalize_logos():
+    """
+    Resize the logos downloaded before they were normalized
+    """
+
+    directory = StaticConfiguration.config_logos_directory_path
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".png") or filename.endswith(".tmp.png"):
+            continue
+        filepath = os.path.join(directory, filename)
+        fd = open(filepath, "rb")
+        data = fd.read()
+        fd.close()
+        if not normalize_logo(data, filepath):
+            print(f"  [!] {filename}: invalid image", file=sys.stderr)
+
+
+def load_atlas_index():
+    """
+    Return the atlas index, or None
+    """
+
+    filepath = os.path.join(StaticConfiguration.config_atlas_directory_path,
+                            ATLAS_INDEX_FILENAME)
+    try:
+        fd = open(filepath)
+        index = json.load(fd)
+        fd.close()
+    except (FileNotFoundError, ValueError):
+        return None
+    return index
+
+
+def get_atlas_stamp():
+    """
+    Return the stamp of the atlas index, that changes when it is rebuilt
+    """
+
+    return get_file_stamp(os.path.join(StaticConfiguration.config_atlas_directory_path,  # noqa: E501
+                                       ATLAS_INDEX_FILENAME))
+
+
+def build_atlas():
+    """
+    Pack the downloaded logos into a few atlas images, and write an index
+    mapping logos to their rectangle. Without pyray, the viewer draws the
+    logos from their own textures
+    """
+
+    try:
+        import pyray
+    except ImportError:
+        return False
+    pyray.set_trace_log_level(pyray.LOG_NONE)
+
+    directory = StaticConfiguration.config_logos_directory_path
+    filenames = sorted(f for f in os.listdir(directory)
+                       if f.endswith(".png") and not f.endswith(".tmp.png"))
+
+    # Only rebuild when logos were added or removed, invalid logos are
+    # listed to be ignored as well
+    index = load_atlas_index()
+    if index is not None and sorted(f"{h}.png" for h in list(index["logos"]) + index.get("skipped", [])) == filenames:  # noqa: E501
+        return False
+
+    images = []
+    skipped = []
+    for filename in filenames:
+        image = pyray.load_image(os.path.join(directory, filename))
+        if not image.width or not image.height:
+            print(f"  [!] {filename}: invalid image", file=sys.stderr)
+            skipped.append(filename[:-len(".png")])
+            continue
+        if max(image.width, image.height) > LOGO_SIZE:
+            scale = LOGO_SIZE / max(image.width, image.height)
+            pyray.image_resize(image, max(1, round(image.width * scale)),
+                               max(1, round(image.height * scale)))
+        images.append((filename[:-len(".png")], image))
+
+    # Shelf packing, tallest logos first
+    images.sort(key=lambda i: (-i[1].height, i[0]))
+    atlases = []
+    logos = {}
+    atlas = None
+    x = y = shelf_height = 0
+    for logo_hash, image in images:
+        if atlas is not None and x + image.width > ATLAS_SIZE:
+            x = 0
+            y += shelf_height + 1
+            shelf_height = 0
+        if atlas is None or y + image.height > ATLAS_SIZE:
+            atlas = pyray.gen_image_color(ATLAS_SIZE, ATLAS_SIZE, pyray.BLANK)
+            atlases.append(atlas)
+            x = y = shelf_height = 0
+
+        source = pyray.Rectangle(0, 0, image.width, image.height)
+        destination = pyray.Rectangle(x, y, image.width, image.height)
+        pyray.image_draw(atlas, image, source, destination, pyray.WHITE)
+        logos[logo_hash] = [len(atlases) - 1, x, y, image.width, image.height]  # noqa: E501
+
+        x += image.width + 1
+        shelf_height = max(shelf_height, image.height)
+        pyray.unload_image(image)
+
+    if not os.path.exists(StaticConfiguration.config_atlas_directory_path):
+        os.makedirs(StaticConfiguration.config_atlas_directory_path)
+
+    atlas_filenames = []
+    for i, atlas in enumerate(atlases):
+        atlas_filename = f"atlas-{i}.png"
+        atlas_filepath = os.path.join(StaticConfiguration.config_atlas_directory_path, atlas_filename)  # noqa: E501
+        tmp_filepath = f"{atlas_filepath}.tmp.png"
+        pyray.export_image(atlas, tmp_filepath)
+        pyray.unload_image(atlas)
+        os.replace(tmp_filepath, atlas_filepath)
+        atlas_filenames.append(atlas_filename)
+
+    index_filepath = os.path.join(StaticConfiguration.config_atlas_directory_path, ATLAS_INDEX_FILENAME)  # noqa: E501
+    tmp_filepath = f"{index_filepath}.tmp"
+    fd = open(tmp_filepath, "w")
+    json.dump({"atlases": atlas_filenames, "logos": logos,
+               "skipped": skipped}, fd)
+    fd.close()
+    os.replace(tmp_filepath, index_filepath)
+
+    print(f"[+] {len(logos)} logos packed in {len(atlases)} atlas")
+    return True
@@ -0,0 +1,111 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+
+from ippon.archive import get_retrieved_dates
+from ippon.config import StaticConfiguration
+from ippon.utils import get_existing_dates
+
+
+def load_manifest(filepath=None):
+    """
+    Load the manifest describing the files used to build the data
+    """
+
+    if filepath is None:
+        filepath = StaticConfiguration.config_manifest_file_path
+
+    try:
+        fd = open(filepath)
+        manifest = json.load(fd)
+        fd.close()
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    return manifest
+
+
+def save_manifest(manifest, filepath=None):
+    """
+    Atomically save the manifest
+    """
+
+    if filepath is None:
+        filepath = StaticConfiguration.config_manifest_file_path
+
+    tmp_filepath = f"{filepath}.tmp"
+    fd = open(tmp_filepath, "w")
+    json.dump(manifest, fd, sort_keys=True)
+    fd.close()
+    os.replace(tmp_filepath, filepath)
+
+
+def get_file_stamp(filepath):
+    """
+    Return the modification time and size of a file, or None
+    """
+
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+@contextmanager
+def locked_manifest(filepath=None):
+    """
+    Load the manifest, and save it on exit, while other processes wait
+    """
+
+    if filepath is None:
+        filepath = StaticConfiguration.config_manifest_file_path
+
+    lock_fd = open(f"{filepath}.lock", "w")
+    fcntl.flock(lock_fd, fcntl.LOCK_EX)
+    try:
+        manifest = load_manifest(filepath)
+        yield manifest
+        save_manifest(manifest, filepath)
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        lock_fd.close()
+
+
+def add_manifest_dates(key, dates, filepath=None):
+    """
+    Add dates to a sorted list of dates stored in the manifest
+    """
+
+    with locked_manifest(filepath) as manifest:
+        if key not in manifest:
+            manifest[key] = sorted(scan_manifest_dates(key))
+        manifest[key] = sorted(set(manifest[key]) | set(dates))
+
+
+def scan_manifest_dates(key):
+    """
+    Return the dates of the retrieved or parsed files in all years
+    """
+
+    if key == "retrieved":
+        return get_retrieved_dates()
+    return get_existing_dates(StaticConfiguration.config_data_json_directory_path,  # noqa: E501
+                              ".json.gz")
+
+
+def get_manifest_dates(manifest, key):
+    """
+    Return a set of dates from the manifest, scanning the data directory
+    the first time
+    """
+
+    if key in manifest:
+        return set(manifest[key])
+
+    add_manifest_dates(key, [])
+    return set(load_manifest()[key])
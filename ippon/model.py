@@ -0,0 +1,408 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+from ippon.config import StaticConfiguration
+from ippon.goals import get_goals_labels
+from ippon.logos import get_logo_filename, get_logo_filepath, \
+    get_atlas_stamp
+from ippon.manifest import get_file_stamp
+from ippon.records import get_competition_filepath, read_levels, \
+    get_competition_path, get_level_path
+from ippon.standings import Standings, load_standings
+from ippon.store import open_store, get_competition_names, \
+    get_competition_levels, get_competition_stamp, load_level
+
+
+class Match(object):
+    """
+    A compact match record
+    """
+
+    __slots__ = ("team1", "team2", "score1", "score2", "logo1", "logo2",
+                 "goals1", "goals2", "labels1", "labels2")
+
+    def __init__(self, game):
+        team1, team2 = game["teams"]
+        self.team1 = sys.intern(team1["team1"]["name"])
+        self.team2 = sys.intern(team2["team2"]["name"])
+        self.score1 = team1["score"]
+        self.score2 = team2["score"]
+        self.logo1 = sys.intern(team1["team1"]["logo"])
+        self.logo2 = sys.intern(team2["team2"]["logo"])
+        self.goals1 = intern_goals(team1["goals"])
+        self.goals2 = intern_goals(team2["goals"])
+        self.labels1 = get_goals_labels(team1)
+        self.labels2 = get_goals_labels(team2)
+
+    def to_tuple(self):
+        return (self.team1, self.team2, self.score1, self.score2, self.logo1,
+                self.logo2, self.goals1, self.goals2, self.labels1,
+                self.labels2)
+
+    @classmethod
+    def from_tuple(cls, values):
+        match = cls.__new__(cls)
+        (match.team1, match.team2, match.score1, match.score2, match.logo1,
+         match.logo2, match.goals1, match.goals2, match.labels1,
+         match.labels2) = values
+        return match
+
+
+def intern_goals(goals):
+    """
+    Return goals as tuples of interned strings
+    """
+
+    return tuple(tuple(sys.intern(v) if v is not None else None for v in goal)
+                 for goal in goals)
+
+
+class JSONSource(object):
+    """
+    Read competitions from the competitions JSON files
+    """
+
+    # Competitions are loaded when they are displayed
+    preload = False
+
+    def get_filepath(self, name):
+        return get_competition_filepath(name)
+
+    def get_names(self, names):
+        return [name for name in names
+                if os.path.exists(self.get_filepath(name))]
+
+    def get_stamp(self, name):
+        return get_file_stamp(self.get_filepath(name))
+
+    def load_standings(self, name):
+        return load_standings(name)
+
+    def load_competition(self, name):
+        """
+        Return a list of (level, matches) tuples
+        """
+
+        levels = {}
+        for level, games in read_levels(self.get_filepath(name)):
+            level = sys.intern(level)
+            levels[level] = levels.get(level, [])
+            levels[level] += [Match(game) for game in games]
+        return list(levels.items())
+
+
+class SQLiteSource(object):
+    """
+    Read competitions from the SQLite store, one level at a time
+    """
+
+    preload = False
+
+    def get_names(self, names):
+        connection = open_store()
+        available = get_competition_names(connection)
+        connection.close()
+        return [name for name in names if name in available]
+
+    def get_stamp(self, name):
+        connection = open_store()
+        stamp = get_competition_stamp(connection, name)
+        connection.close()
+        return stamp
+
+    def load_competition(self, name):
+        connection = open_store()
+        levels = get_competition_levels(connection, name)
+        connection.close()
+        # Matches are loaded by load_level() when the level is displayed
+        return [(sys.intern(level), None) for level in levels]
+
+    def load_level(self, name, level):
+        connection = open_store()
+        games = load_level(connection, name, level)
+        connection.close()
+        return [Match(game) for game in games]
+
+    def load_standings(self, name):
+        return load_standings(name)
+
+
+class RemoteSource(object):
+    """
+    Read competitions from an 'ippon serve' node, only downloading the
+    documents whose ETag changed
+    """
+
+    # Competitions are downloaded by the watcher, never by the render thread
+    preload = True
+
+    def __init__(self, url, timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.documents = {}
+        self.index = {}
+        # Matches of each level, as (etag, matches) tuples
+        self.levels = {}
+        self.standings = {}
+
+    def fetch(self, path, etag=None):
+        """
+        Return the ETag and body of path, the body is None when it matches
+        etag
+        """
+
+        request = urllib.request.Request(self.url + path,
+                                         headers={"Accept-Encoding": "gzip"})
+        if etag:
+            request.add_header("If-None-Match", etag)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return etag, None
+            raise
+
+        data = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        return response.headers.get("ETag"), data
+
+    def fetch_json(self, path):
+        """
+        Return a JSON document, reusing the previous one when unchanged
+        """
+
+        with self.lock:
+            previous = self.documents.get(path)
+            etag, data = self.fetch(path, previous[0] if previous else None)
+            if data is None:
+                return previous[1]
+            document = json.loads(data)
+            self.documents[path] = (etag, document)
+            return document
+
+    def get_names(self, names=None):
+        self.index = {c["name"]: c["etag"]
+                      for c in self.fetch_json("/competitions")}
+        if names is None:
+            return list(self.index)
+        return [name for name in names if name in self.index]
+
+    def get_stamp(self, name):
+        return self.index.get(name)
+
+    def load_competition(self, name):
+        levels = []
+        for entry in self.fetch_json(get_competition_path(name)):
+            level = sys.intern(entry["level"])
+            with self.lock:
+                cached = self.levels.get((name, level))
+            if cached is None or cached[0] != entry["etag"]:
+                games = self.fetch_json(get_level_path(name, level))
+                cached = (entry["etag"], [Match(game) for game in games])
+                with self.lock:
+                    self.levels[(name, level)] = cached
+                self.download_logos(cached[1])
+            levels.append((level, cached[1]))
+
+        # Standings are displayed from memory, the previous ones are kept
+        # when they cannot be downloaded
+        try:
+            standings = self.fetch_json(get_competition_path(name) + "/standings")  # noqa: E501
+        except (OSError, ValueError):
+            standings = None
+        if standings is not None:
+            with self.lock:
+                self.standings[name] = Standings(standings) if standings else None  # noqa: E501
+        return levels
+
+    def download_logos(self, matches):
+        """
+        Copy the logos of matches that are missing locally from the server
+        """
+
+        os.makedirs(StaticConfiguration.config_logos_directory_path,
+                    exist_ok=True)
+        logo_urls = set()
+        for match in matches:
+            logo_urls.update([match.logo1, match.logo2])
+
+        for logo_url in logo_urls:
+            logo_filepath = get_logo_filepath(logo_url)
+            if os.path.exists(logo_filepath):
+                continue
+            try:
+                _, data = self.fetch(f"/logos/{get_logo_filename(logo_url)}")
+            except OSError:
+                continue
+            tmp_filepath = f"{logo_filepath}.tmp.png"
+            fd = open(tmp_filepath, "wb")
+            fd.write(data)
+            fd.close()
+            os.replace(tmp_filepath, logo_filepath)
+
+    def load_standings(self, name):
+        with self.lock:
+            return self.standings.get(name)
+
+
+class Competition(object):
+    """
+    The levels of a competition, loaded on first access
+    """
+
+    __slots__ = ("name", "source", "levels")
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.levels = None
+
+    def load(self):
+        if self.levels is None:
+            self.levels = dict(self.source.load_competition(self.name))
+        return self.levels
+
+    def keys(self):
+        return self.load().keys()
+
+    def __getitem__(self, level):
+        levels = self.load()
+        matches = levels[level]
+        if matches is None:
+            matches = self.source.load_level(self.name, level)
+            levels[level] = matches
+        return matches
+
+
+class Scores(object):
+    """
+    The competitions available to the viewer, names is None to follow the
+    competitions listed by the source
+    """
+
+    def __init__(self, names, source):
+        self.names = names
+        self.source = source
+        self.competitions = {}
+        self.stamps = {}
+        # Incremented each time competitions are swapped by reload()
+        self.version = 0
+        for name in source.get_names(names):
+            self.competitions[sys.intern(name)] = Competition(name, source)
+            self.stamps[name] = source.get_stamp(name)
+
+    def keys(self):
+        return self.competitions.keys()
+
+    def __getitem__(self, name):
+        return self.competitions[name]
+
+    def preload(self):
+        """
+        Load the competitions of sources that must not be read by the render
+        thread, the ones that fail are retried by reload()
+        """
+
+        if not self.source.preload:
+            return
+        for name in list(self.competitions):
+            try:
+                self.competitions[name].load()
+            except (OSError, ValueError) as e:
+                print(f"[!] {name} not loaded: {e}", file=sys.stderr)
+                del self.competitions[name]
+                del self.stamps[name]
+
+    def reload(self):
+        """
+        Reload the competitions whose data changed or disappeared, and
+        return their names
+        """
+
+        changed = []
+        competitions = dict(self.competitions)
+        available = self.source.get_names(self.names)
+        for name in available:
+            stamp = self.source.get_stamp(name)
+            if name in competitions and self.stamps.get(name) == stamp:
+                continue
+
+            competition = Competition(name, self.source)
+            previous = competitions.get(name)
+            if self.source.preload \
+               or (previous is not None and previous.levels is not None):
+                # Load it here rather than in the render thread, and keep
+                # the previous version until it can be loaded
+                try:
+                    competition.load()
+                except (OSError, EOFError, ValueError, sqlite3.Error) as e:
+                    print(f"[!] {name} not reloaded: {e}", file=sys.stderr)
+                    continue
+            competitions[sys.intern(name)] = competition
+            self.stamps[name] = stamp
+            changed.append(name)
+
+        # Drop the competitions whose data disappeared, unless none is left
+        # to display
+        if available:
+            for name in [n for n in competitions if n not in available]:
+                del competitions[name]
+                self.stamps.pop(name, None)
+                changed.append(name)
+
+        if changed:
+            # Keep the configuration order, or the order of the source
+            names = self.names if self.names is not None else available
+            self.competitions = {name: competitions[name]
+                                 for name in names
+                                 if name in competitions}
+            self.version += 1
+        return changed
+
+
+class ScoresWatcher(object):
+    """
+    Periodically reload changed competitions in a background thread, and
+    notice atlas rebuilds
+    """
+
+    def __init__(self, scores, interval):
+        self.scores = scores
+        self.interval = interval
+        # Incremented each time the atlas is rebuilt, it is uploaded by the
+        # render thread
+        self.atlas_version = 0
+        self.atlas_stamp = get_atlas_stamp()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self.thread.start()
+
+    def _watch(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.scores.reload()
+            except (OSError, ValueError, sqlite3.Error) as e:
+                # A file being replaced is retried at the next interval
+                print(f"[!] reload failed: {e}", file=sys.stderr)
+
+            atlas_stamp = get_atlas_stamp()
+            if atlas_stamp != self.atlas_stamp:
+                self.atlas_stamp = atlas_stamp
+                self.atlas_version += 1
+
+    def stop(self):
+        self.stop_event.set()
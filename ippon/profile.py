@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class Profile(object):
+    """
+    Spans durations and counters recorded while a command runs
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.start = time.monotonic()
+
+    def add_span(self, name, duration):
+        with self.lock:
+            span = self.spans.get(name)
+            if span is None:
+                span = self.spans[name] = {"count": 0, "seconds": 0.0,
+                                           "max": 0.0}
+            span["count"] += 1
+            span["seconds"] += duration
+            span["max"] = max(span["max"], duration)
+
+    def add_counter(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        with self.lock:
+            return {"seconds": time.monotonic() - self.start,
+                    "spans": {n: dict(s) for n, s in self.spans.items()},
+                    "counters": dict(self.counters)}
+
+
+# Shared by all threads, spans of worker processes are not collected
+profile = Profile()
+
+
+def enable_profile():
+    profile.enabled = True
+    profile.start = time.monotonic()
+
+
+@contextmanager
+def span(name):
+    """
+    Record the duration of the block
+    """
+
+    if not profile.enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(name, time.perf_counter() - start)
+
+
+def count(name, value=1):
+    if profile.enabled:
+        profile.add_counter(name, value)
+
+
+def get_prometheus_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def format_prometheus(report):
+    """
+    Return a report in the Prometheus text format
+    """
+
+    lines = ["# TYPE ippon_run_seconds gauge",
+             f"ippon_run_seconds {report['seconds']:.6f}",
+             "# TYPE ippon_span_seconds_total counter",
+             "# TYPE ippon_span_count_total counter",
+             "# TYPE ippon_span_max_seconds gauge"]
+    for name in sorted(report["spans"]):
+        span = report["spans"][name]
+        label = f'{{span="{name}"}}'
+        lines.append(f"ippon_span_seconds_total{label} {span['seconds']:.6f}")  # noqa: E501
+        lines.append(f"ippon_span_count_total{label} {span['count']}")
+        lines.append(f"ippon_span_max_seconds{label} {span['max']:.6f}")
+    for name in sorted(report["counters"]):
+        metric = f"ippon_{get_prometheus_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {report['counters'][name]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_profile(filepath):
+    """
+    Write the report as a Prometheus textfile if filepath ends with .prom,
+    as JSON otherwise
+    """
+
+    report = profile.report()
+    if filepath.endswith(".prom"):
+        data = format_prometheus(report)
+    else:
+        data = json.dumps(report, indent=2, sort_keys=True) + "\n"
+
+    # The node exporter must never read a partial textfile
+    tmp_filepath = f"{filepath}.tmp"
+    fd = open(tmp_filepath, "w")
+    fd.write(data)
+    fd.close()
+    os.replace(tmp_filepath, filepath)
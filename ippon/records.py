@@ -0,0 +1,77 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import gzip
+from itertools import groupby
+import json
+import os
+from urllib.parse import quote
+
+from ippon.config import StaticConfiguration
+
+
+# One match per line, matches of a level are consecutive
+COMPETITION_SUFFIX = ".ndjson.gz"
+
+# Incremented when the content of the records changes
+RECORDS_VERSION = 2
+
+
+def get_competition_filepath(name):
+    return os.path.join(StaticConfiguration.config_competitions_directory_path,  # noqa: E501
+                        f"{name}{COMPETITION_SUFFIX}")
+
+
+def get_competition_path(name):
+    """
+    Return the path of a competition served by 'ippon serve'
+    """
+
+    return f"/competitions/{quote(name, safe='')}"
+
+
+def get_level_path(name, level):
+    return f"{get_competition_path(name)}/levels/{quote(level, safe='')}"
+
+
+def write_records_atomic(filepath, records):
+    """
+    Stream records to a gzip compressed temporary file, one JSON document
+    per line, then move it in place and return the number of records
+    """
+
+    tmp_filepath = f"{filepath}.tmp"
+    fd = gzip.open(tmp_filepath, "wt", encoding="utf-8")
+    written = 0
+    try:
+        for record in records:
+            fd.write(json.dumps(record) + "\n")
+            written += 1
+    finally:
+        fd.close()
+    os.replace(tmp_filepath, filepath)
+    return written
+
+
+def read_records(filepath):
+    """
+    Yield the records of a file, one line at a time
+    """
+
+    fd = gzip.open(filepath, "rt", encoding="utf-8")
+    try:
+        for line in fd:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        fd.close()
+
+
+def read_levels(filepath):
+    """
+    Yield (level, matches) tuples, holding a single level in memory
+    """
+
+    for level, matches in groupby(read_records(filepath),
+                                  key=lambda m: m["competition"]["level"]):
+        yield level, list(matches)
@@ -0,0 +1,198 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import sys
+import threading
+from urllib.parse import unquote
+
+from ippon.config import init_config, StaticConfiguration, \
+    get_config_competitions
+from ippon.manifest import get_file_stamp
+from ippon.records import get_competition_filepath, read_levels, \
+    get_competition_path, get_level_path
+from ippon.standings import get_standings_filepath
+
+
+class Resource(object):
+    """
+    A gzip compressed response body and its ETag
+    """
+
+    __slots__ = ("etag", "body", "content_type")
+
+    def __init__(self, data, content_type="application/json", etag=None):
+        if etag is None:
+            etag = '"%s"' % hashlib.sha1(data).hexdigest()[:20]
+        self.etag = etag
+        self.body = gzip.compress(data, mtime=0)
+        self.content_type = content_type
+
+
+class ScoresServer(object):
+    """
+    Keep the built competitions in memory as precompressed resources, and
+    reload the ones whose files changed
+    """
+
+    def __init__(self, reload_interval=10):
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.stamps = {}
+        self.config_stamp = None
+        self.names = []
+        self.stop_event = threading.Event()
+
+    def get(self, path):
+        resource = self.resources.get(path)
+        if resource is None and path.startswith("/logos/"):
+            resource = self.load_logo(path)
+        return resource
+
+    def load_logo(self, path):
+        filename = os.path.basename(unquote(path))
+        if not filename.endswith(".png") or filename != path[len("/logos/"):]:  # noqa: E501
+            return None
+        filepath = os.path.join(StaticConfiguration.config_logos_directory_path, filename)  # noqa: E501
+        try:
+            fd = open(filepath, "rb")
+            stat = os.fstat(fd.fileno())
+            data = fd.read()
+            fd.close()
+        except OSError:
+            return None
+
+        # Logos are read from disk, they are small and rarely requested
+        etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        return Resource(data, "image/png", etag)
+
+    def reload(self):
+        """
+        Rebuild the resources of the competitions whose files changed
+        """
+
+        config_stamp = get_file_stamp(StaticConfiguration.config_file_path)
+        if config_stamp != self.config_stamp:
+            config = init_config(StaticConfiguration.config_file_path)
+            self.names = [c["name"] for c in get_config_competitions(config)]
+            self.config_stamp = config_stamp
+
+        resources = dict(self.resources)
+        changed = []
+        for name in self.names:
+            stamp = [get_file_stamp(get_competition_filepath(name)),
+                     get_file_stamp(get_standings_filepath(name))]
+            if stamp == self.stamps.get(name):
+                continue
+            self.stamps[name] = stamp
+            changed.append(name)
+
+            # Drop the resources of the previous version
+            prefix = get_competition_path(name) + "/"
+            for path in [p for p in resources if p.startswith(prefix)]:
+                del resources[path]
+            resources.pop(get_competition_path(name), None)
+            if stamp[0] is None:
+                continue
+
+            levels = []
+            for level, matches in read_levels(get_competition_filepath(name)):  # noqa: E501
+                resource = Resource(json.dumps(matches).encode())
+                resources[get_level_path(name, level)] = resource
+                levels.append({"level": level, "etag": resource.etag})
+            resources[get_competition_path(name)] = Resource(json.dumps(levels).encode())  # noqa: E501
+
+            if stamp[1] is not None:
+                fd = gzip.open(get_standings_filepath(name), "r")
+                resources[f"{prefix}standings"] = Resource(fd.read())
+                fd.close()
+
+        if not changed and "/competitions" in resources:
+            return changed
+
+        index = [{"name": name, "etag": resources[get_competition_path(name)].etag}  # noqa: E501
+                 for name in self.names
+                 if get_competition_path(name) in resources]
+        resources["/competitions"] = Resource(json.dumps(index).encode())
+
+        with self.lock:
+            self.resources = resources
+        return changed
+
+    def watch(self):
+        while not self.stop_event.wait(self.reload_interval):
+            try:
+                changed = self.reload()
+            except (OSError, ValueError) as e:
+                print(f"[!] reload failed: {e}", file=sys.stderr)
+                continue
+            for name in changed:
+                print(f"[+] {name} reloaded")
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    server_version = "ippon"
+
+    def do_GET(self):
+        resource = self.server.scores.get(self.path.split("?")[0])
+        if resource is None:
+            self.send_error(404)
+            return
+
+        if self.headers.get("If-None-Match") == resource.etag:
+            self.send_response(304)
+            self.send_header("ETag", resource.etag)
+            self.end_headers()
+            return
+
+        body = resource.body
+        compressed = "gzip" in self.headers.get("Accept-Encoding", "")
+        if not compressed:
+            body = gzip.decompress(body)
+
+        self.send_response(200)
+        self.send_header("Content-Type", resource.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", resource.etag)
+        self.send_header("Cache-Control", "no-cache")
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_logic(host="0.0.0.0", port=8080, reload_interval=10):
+    """
+    Serve the competitions, their levels, standings and logos over HTTP
+    """
+
+    scores = ScoresServer(reload_interval)
+    try:
+        scores.reload()
+    except FileNotFoundError:
+        print(f"{StaticConfiguration.config_file_path} not found!",
+              file=sys.stderr)
+        return
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.scores = scores
+    watcher = threading.Thread(target=scores.watch, daemon=True)
+    watcher.start()
+
+    print(f"[+] Serving {len(scores.names)} competitions on {host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    scores.stop_event.set()
+    server.server_close()
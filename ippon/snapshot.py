@@ -0,0 +1,191 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import marshal
+import os
+import struct
+import sys
+
+from ippon.config import StaticConfiguration
+from ippon.manifest import get_file_stamp
+from ippon.model import Match, JSONSource
+from ippon.records import get_competition_filepath, read_levels
+
+
+# marshal data is only valid for the Python version that wrote it
+SNAPSHOT_VERSION = (3,) + tuple(sys.version_info[:2])
+
+# The snapshot ends with the offset of its header
+SNAPSHOT_TRAILER = struct.Struct("<Q")
+
+
+def load_snapshot(filepath=None):
+    """
+    Return the header of the snapshot of the viewer data, or None. It holds
+    the stamps of the sources, and the offset and size of each competition
+    """
+
+    if filepath is None:
+        filepath = StaticConfiguration.config_snapshot_file_path
+
+    try:
+        fd = open(filepath, "rb")
+        try:
+            fd.seek(-SNAPSHOT_TRAILER.size, os.SEEK_END)
+            header_offset, = SNAPSHOT_TRAILER.unpack(fd.read(SNAPSHOT_TRAILER.size))  # noqa: E501
+            fd.seek(header_offset)
+            header = marshal.load(fd)
+        finally:
+            fd.close()
+    except (OSError, EOFError, ValueError, TypeError, struct.error):
+        return None
+    if not isinstance(header, dict) \
+       or header.get("version") != SNAPSHOT_VERSION:
+        return None
+    return header
+
+
+def load_snapshot_competition(header, name, filepath=None):
+    """
+    Return the levels of a competition as marshaled tuples, or None if the
+    snapshot does not hold the version described by header
+    """
+
+    if filepath is None:
+        filepath = StaticConfiguration.config_snapshot_file_path
+
+    location = header["offsets"].get(name)
+    if location is None:
+        return None
+    offset, size = location
+    try:
+        fd = open(filepath, "rb")
+        try:
+            fd.seek(offset)
+            entry = marshal.loads(fd.read(size))
+        finally:
+            fd.close()
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    # The snapshot may have been replaced since its header was read
+    if not isinstance(entry, tuple) or len(entry) != 3 \
+       or entry[0] != name or entry[1] != header["stamps"].get(name):
+        return None
+    return entry[2]
+
+
+class SnapshotSource(JSONSource):
+    """
+    Read competitions from the snapshot written by build, and from the
+    competitions files when their snapshot is stale
+    """
+
+    def __init__(self, header, filepath=None):
+        if filepath is None:
+            filepath = StaticConfiguration.config_snapshot_file_path
+        self.filepath = filepath
+        self.header = header
+        self.header_stamp = get_file_stamp(filepath)
+
+    def get_header(self):
+        # build replaces the snapshot while the viewer is running
+        stamp = get_file_stamp(self.filepath)
+        if stamp != self.header_stamp:
+            self.header = load_snapshot(self.filepath)
+            self.header_stamp = stamp
+        return self.header
+
+    def load_competition(self, name):
+        levels = None
+        header = self.get_header()
+        if header is not None \
+           and header["stamps"].get(name) == self.get_stamp(name):
+            levels = load_snapshot_competition(header, name, self.filepath)
+        if levels is None:
+            return JSONSource.load_competition(self, name)
+
+        # Only the Match objects are kept
+        return [(sys.intern(level), [Match.from_tuple(m) for m in matches])
+                for level, matches in levels]
+
+
+def get_snapshot_names(snapshot):
+    """
+    Return the competitions names of the snapshot, or None if the
+    configuration changed since it was written
+    """
+
+    if snapshot is None:
+        return None
+    if snapshot["config"] != get_file_stamp(StaticConfiguration.config_file_path):  # noqa: E501
+        return None
+    return snapshot["names"]
+
+
+def write_snapshot(names, filepath=None):
+    """
+    Write the matches of the competitions as marshaled tuples, one
+    competition at a time, and return True if the snapshot changed
+    """
+
+    if filepath is None:
+        filepath = StaticConfiguration.config_snapshot_file_path
+
+    config_stamp = get_file_stamp(StaticConfiguration.config_file_path)
+    stamps = {}
+    for name in names:
+        stamp = get_file_stamp(get_competition_filepath(name))
+        if stamp is not None:
+            stamps[name] = stamp
+
+    # Only the header is read when the sources did not change
+    previous = load_snapshot(filepath)
+    if previous is not None and previous["config"] == config_stamp \
+       and previous["names"] == names and previous["stamps"] == stamps:
+        return False
+
+    previous_fd = None
+    if previous is not None:
+        try:
+            previous_fd = open(filepath, "rb")
+        except OSError:
+            previous = None
+
+    offsets = {}
+    tmp_filepath = f"{filepath}.tmp"
+    fd = open(tmp_filepath, "wb")
+    try:
+        for name, stamp in stamps.items():
+            data = None
+            # Unchanged competitions are copied from the previous snapshot
+            if previous is not None and previous["stamps"].get(name) == stamp \
+               and name in previous["offsets"]:
+                offset, size = previous["offsets"][name]
+                previous_fd.seek(offset)
+                data = previous_fd.read(size)
+                if len(data) != size:
+                    data = None
+
+            if data is None:
+                levels = tuple((level, tuple(Match(game).to_tuple() for game in games))  # noqa: E501
+                               for level, games in read_levels(get_competition_filepath(name)))  # noqa: E501
+                data = marshal.dumps((name, stamp, levels))
+
+            offsets[name] = (fd.tell(), len(data))
+            fd.write(data)
+
+        header = {"version": SNAPSHOT_VERSION,
+                  "config": config_stamp,
+                  "names": names,
+                  "stamps": stamps,
+                  "offsets": offsets}
+        header_offset = fd.tell()
+        marshal.dump(header, fd)
+        fd.write(SNAPSHOT_TRAILER.pack(header_offset))
+    finally:
+        fd.close()
+        if previous_fd is not None:
+            previous_fd.close()
+    os.replace(tmp_filepath, filepath)
+    return True
@@ -0,0 +1,159 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import gzip
+import json
+import os
+
+from ippon.config import StaticConfiguration
+from ippon.profile import count
+from ippon.utils import gzip_write_atomic
+
+
+STANDINGS_SUFFIX = ".standings.json.gz"
+
+POINTS_WIN = 3
+POINTS_DRAW = 1
+FORM_LENGTH = 5
+
+
+def get_standings_filepath(name):
+    return os.path.join(StaticConfiguration.config_competitions_directory_path,  # noqa: E501
+                        f"{name}{STANDINGS_SUFFIX}")
+
+
+def get_level_delta(matches):
+    """
+    Return the won, drawn, lost, goals for, goals against and results of
+    each team during a level
+    """
+
+    delta = {}
+    for match in matches:
+        team1, team2 = match["teams"]
+        score1, score2 = team1["score"], team2["score"]
+        # Postponed matches have no score
+        if not isinstance(score1, int) or not isinstance(score2, int):
+            continue
+
+        for name, goals_for, goals_against in \
+                [(team1["team1"]["name"], score1, score2),
+                 (team2["team2"]["name"], score2, score1)]:
+            won, drawn, lost, total_for, total_against, results = \
+                delta.get(name, [0, 0, 0, 0, 0, ""])
+            if goals_for > goals_against:
+                won += 1
+                results += "W"
+            elif goals_for == goals_against:
+                drawn += 1
+                results += "D"
+            else:
+                lost += 1
+                results += "L"
+            delta[name] = [won, drawn, lost, total_for + goals_for,
+                           total_against + goals_against, results]
+    return delta
+
+
+def load_standings_levels(name):
+    """
+    Return the levels stored for a competition, or an empty list
+    """
+
+    try:
+        fd = gzip.open(get_standings_filepath(name), "r")
+        levels = json.loads(fd.read())
+        fd.close()
+    except (FileNotFoundError, ValueError, OSError):
+        return []
+    return levels
+
+
+def update_standings(name, levels_days, days, load_day):
+    """
+    Store the delta of each level of a competition, only recomputing the
+    levels whose days changed
+    """
+
+    previous = {entry["level"]: entry for entry in load_standings_levels(name)}
+
+    levels = []
+    for level, level_days in levels_days.items():
+        key = [[date, days[date]["stamp"]] for date in level_days]
+        entry = previous.get(level)
+        if entry is None or entry["key"] != key:
+            matches = [c for date in level_days for c in load_day(date)[name]
+                       if c["competition"]["level"] == level]
+            entry = {"level": level, "key": key,
+                     "delta": get_level_delta(matches)}
+            count("build.standings.levels")
+        levels.append(entry)
+
+    gzip_write_atomic(get_standings_filepath(name), json.dumps(levels).encode())  # noqa: E501
+
+
+class Standings(object):
+    """
+    League tables of a competition after each level, computed on first
+    access from the previous one
+    """
+
+    def __init__(self, levels):
+        self.levels = [(entry["level"], entry["delta"]) for entry in levels]
+        self.index = {level: i for i, (level, _) in enumerate(self.levels)}
+        self.tables = []
+        self.rows = {}
+
+    def get_table(self, index):
+        while len(self.tables) <= index:
+            table = dict(self.tables[-1]) if self.tables else {}
+            _, delta = self.levels[len(self.tables)]
+            for team, values in delta.items():
+                won, drawn, lost, goals_for, goals_against, results = values
+                previous = table.get(team, (0, 0, 0, 0, 0, ""))
+                table[team] = (previous[0] + won, previous[1] + drawn,
+                               previous[2] + lost, previous[3] + goals_for,
+                               previous[4] + goals_against,
+                               (previous[5] + results)[-FORM_LENGTH:])
+            self.tables.append(table)
+        return self.tables[index]
+
+    def get_rows(self, level):
+        """
+        Return the sorted table after level, or None
+        """
+
+        index = self.index.get(level)
+        if index is None:
+            return None
+        if index in self.rows:
+            return self.rows[index]
+
+        rows = []
+        for team, values in self.get_table(index).items():
+            won, drawn, lost, goals_for, goals_against, form = values
+            rows.append({"team": team,
+                         "played": won + drawn + lost,
+                         "won": won,
+                         "drawn": drawn,
+                         "lost": lost,
+                         "goals_for": goals_for,
+                         "goals_against": goals_against,
+                         "goal_difference": goals_for - goals_against,
+                         "points": won * POINTS_WIN + drawn * POINTS_DRAW,
+                         "form": form})
+        rows.sort(key=lambda r: (-r["points"], -r["goal_difference"],
+                                 -r["goals_for"], r["team"]))
+        self.rows[index] = rows
+        return rows
+
+
+def load_standings(name):
+    """
+    Return the standings of a competition, or None
+    """
+
+    levels = load_standings_levels(name)
+    if not levels:
+        return None
+    return Standings(levels)
@@ -2,59 +2,129 @@
 # Guillaume Valadon <guillaume@valadon.net>
 
 from datetime import datetime
-import os
+import json
 import sys
 
-from ippon.config import init_config, load_configuation, StaticConfiguration, \
+from ippon.analytics import get_goals_report
+from ippon.config import init_config, StaticConfiguration, \
                          get_config_competitions
-from ippon.utils import get_competitions_dates
+from ippon.manifest import load_manifest, get_manifest_dates
+from ippon.store import open_store, get_competition_days
+from ippon.utils import get_competitions_dates, get_all_dates, \
+                        get_planned_dates
 
 
-def get_file_count(directory):
+def get_competition_coverage(competition, retrieved, parsed, aggregated):
     """
-    Return the number of files in a directory
+    Return the days of a competition, and the ones that are not available
     """
 
-    try:
-        return len(os.listdir(directory))
-    except FileNotFoundError:
-        return 0
+    start = datetime.strptime(competition["start"], "%d/%m/%Y")
+    end = datetime.strptime(competition["end"], "%d/%m/%Y")
+    dates = get_all_dates(start, end)
+
+    return {"year": competition["year"],
+            "start": start.strftime("%Y%m%d"),
+            "end": end.strftime("%Y%m%d"),
+            "days": len(dates),
+            "missing": [d for d in dates if d not in retrieved],
+            "unparsed": [d for d in dates if d in retrieved and d not in parsed],  # noqa: E501
+            "aggregated": len(aggregated.get(competition["name"], []))}
+
+
+def print_dates(dates):
+    for i in range(0, len(dates), 6):
+        print("             " + " ".join(dates[i:i + 6]))
+
+
+def print_goals(report):
+    print(f"\n[-] Goals: {report['goals']}")
+    print("    Top scorers")
+    for scorer in report["top_scorers"]:
+        print("      %-30s %3d  (%d pen)" % (f"{scorer['scorer']} ({scorer['team']})",  # noqa: E501
+                                             scorer["goals"], scorer["penalties"]))  # noqa: E501
+    print("    Minutes")
+    for minutes, goals in report["minutes"].items():
+        print("      %-6s %5d" % (minutes, goals))
+    print(f"    Stoppage time: {report['stoppage_time']}")
+    print("    Seasons")
+    for season in report["seasons"]:
+        print("      %s: %d goals, %.1f%% penalties, %.1f%% own goals"
+              % (season["season"], season["goals"],
+                 season["penalty_rate"] * 100, season["own_goal_rate"] * 100))  # noqa: E501
 
 
-def main(competition):
+def main(competition, sqlite=False, as_json=False, goals=False, top=10):
 
     try:
-        init_config(StaticConfiguration.config_file_path)
-        config = load_configuation(StaticConfiguration.config_file_path)
+        config = init_config(StaticConfiguration.config_file_path)
     except FileNotFoundError:
         print(f"{StaticConfiguration.config_file_path} not found!",
               file=sys.stderr)
         return
 
+    manifest = load_manifest()
+    retrieved = get_manifest_dates(manifest, "retrieved")
+    parsed = get_manifest_dates(manifest, "parsed")
+    aggregated = manifest.get("competitions", {})
+
     max_start, max_end = get_competitions_dates(config)
+    dates = get_planned_dates(config)
+
+    report = {"days": {"start": max_start.strftime("%Y%m%d"),
+                       "end": max_end.strftime("%Y%m%d"),
+                       "total": len(dates),
+                       "missing": len([d for d in dates if d not in retrieved])},  # noqa: E501
+              "competitions": {}}
 
     competitions = get_config_competitions(config)
-    for competition in competitions:
-        name = competition["name"]
-        year = competition["year"]
-        print(f"[+] {name} - {year}")
+    for tmp_competition in competitions:
+        name = tmp_competition["name"]
+        if competition and name != competition:
+            continue
+        report["competitions"][name] = get_competition_coverage(tmp_competition, retrieved, parsed, aggregated)  # noqa: E501
+
+    if sqlite:
+        connection = open_store()
+        competition_days = get_competition_days(connection)
+        connection.close()
+        report["sqlite"] = {name: {"days": days, "matches": matches}
+                            for name, (days, matches)
+                            in competition_days.items()}
+
+    if goals:
+        selected = [c for c in competitions
+                    if not competition or c["name"] == competition]
+        goals_report = get_goals_report(selected, top)
+        if goals_report is None:
+            # The coverage report does not need numpy
+            print("numpy is required for goals analytics!", file=sys.stderr)
+        else:
+            report["goals"] = goals_report
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for name, coverage in report["competitions"].items():
+        print(f"[+] {name} - {coverage['year']}")
+        print(f"    Days:       {coverage['days']}")
+        print(f"    Missing:    {len(coverage['missing'])}")
+        print_dates(coverage["missing"])
+        print(f"    Unparsed:   {len(coverage['unparsed'])}")
+        print_dates(coverage["unparsed"])
+        print(f"    Aggregated: {coverage['aggregated']}")
 
     print("\n[-] Days")
     print("    Start:   {}".format(max_start.strftime("%d/%m/%Y")))
     print("    End:     {}".format(max_end.strftime("%d/%m/%Y")))
+    print("    Total:   {}".format(report["days"]["total"]))
+    print("    Missing: {}".format(report["days"]["missing"]))
 
-    today = datetime.today()
-    if today < max_end:
-        max_end = today
-
-    total_days = max_end - max_start
-    print("    Total:   {}".format(total_days.days))
-
-    missing_days = total_days.days
-
-    for year in set([max_start.year, max_end.year]):
-        tmp_directory_path = os.path.join(StaticConfiguration.config_data_raw_directory_path,  # noqa: E501
-                                          f"{year}")
-        missing_days -= get_file_count(tmp_directory_path)
+    if sqlite:
+        print("\n[-] SQLite")
+        for name in sorted(report["sqlite"]):
+            print(f"    {name}: {report['sqlite'][name]['days']} days, {report['sqlite'][name]['matches']} matches")  # noqa: E501
 
-    print("    Missing: {}".format(missing_days))
+    if "goals" in report:
+        print_goals(report["goals"])
@@ -0,0 +1,220 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+import gzip
+import json
+import os
+import sqlite3
+
+from ippon.config import StaticConfiguration
+from ippon.manifest import get_file_stamp
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    date TEXT PRIMARY KEY,
+    stamp TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS teams (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    logo TEXT NOT NULL,
+    UNIQUE (name, logo)
+);
+
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    sport TEXT NOT NULL,
+    date TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    competition TEXT NOT NULL,
+    level TEXT NOT NULL,
+    team1_id INTEGER NOT NULL REFERENCES teams (id),
+    team2_id INTEGER NOT NULL REFERENCES teams (id),
+    score1,
+    score2,
+    rank1 INTEGER,
+    rank2 INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS goals (
+    match_id INTEGER NOT NULL REFERENCES matches (id),
+    team INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    scorer TEXT,
+    time TEXT,
+    type TEXT
+);
+
+CREATE INDEX IF NOT EXISTS matches_competition_level
+    ON matches (competition, level);
+CREATE INDEX IF NOT EXISTS matches_date ON matches (date);
+CREATE INDEX IF NOT EXISTS matches_team1 ON matches (team1_id);
+CREATE INDEX IF NOT EXISTS matches_team2 ON matches (team2_id);
+CREATE INDEX IF NOT EXISTS goals_match ON goals (match_id);
+"""
+
+
+def open_store(filepath=None):
+    """
+    Open the SQLite store, and create its tables if needed
+    """
+
+    if filepath is None:
+        filepath = StaticConfiguration.config_database_file_path
+
+    connection = sqlite3.connect(filepath)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_team_id(connection, team):
+    connection.execute("INSERT OR IGNORE INTO teams (name, logo) VALUES (?, ?)",  # noqa: E501
+                       (team["name"], team["logo"]))
+    row = connection.execute("SELECT id FROM teams WHERE name = ? AND logo = ?",  # noqa: E501
+                             (team["name"], team["logo"])).fetchone()
+    return row[0]
+
+
+def upsert_day(connection, date, stamp, competitions):
+    """
+    Replace the matches of a day
+    """
+
+    connection.execute("DELETE FROM goals WHERE match_id IN (SELECT id FROM matches WHERE date = ?)",  # noqa: E501
+                       (date,))
+    connection.execute("DELETE FROM matches WHERE date = ?", (date,))
+
+    for position, competition in enumerate(competitions):
+        team1, team2 = competition["teams"]
+        team1_id = get_team_id(connection, team1["team1"])
+        team2_id = get_team_id(connection, team2["team2"])
+        cursor = connection.execute("INSERT INTO matches (sport, date, position, competition, level, team1_id, team2_id, score1, score2, rank1, rank2) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",  # noqa: E501
+                                    (competition["sport"], date, position,
+                                     competition["competition"]["name"],
+                                     competition["competition"]["level"],
+                                     team1_id, team2_id,
+                                     team1["score"], team2["score"],
+                                     team1["rank"], team2["rank"]))
+        match_id = cursor.lastrowid
+
+        for team, data in enumerate([team1, team2]):
+            for goal_position, goal in enumerate(data["goals"]):
+                connection.execute("INSERT INTO goals (match_id, team, position, scorer, time, type) VALUES (?, ?, ?, ?, ?, ?)",  # noqa: E501
+                                   (match_id, team, goal_position,
+                                    goal[0], goal[1], goal[2]))
+
+    connection.execute("INSERT OR REPLACE INTO days (date, stamp) VALUES (?, ?)",  # noqa: E501
+                       (date, json.dumps(stamp)))
+
+
+def update_store(dates_needed):
+    """
+    Upsert the days whose JSON file changed since the last update
+    """
+
+    connection = open_store()
+    stamps = dict(connection.execute("SELECT date, stamp FROM days"))
+
+    updated = 0
+    for date in dates_needed:
+        filepath_json = os.path.join(StaticConfiguration.config_data_json_directory_path,  # noqa: E501
+                                     date[:4], f"{date}.Football.json.gz")
+        stamp = get_file_stamp(filepath_json)
+        if stamp is None or stamps.get(date) == json.dumps(stamp):
+            continue
+
+        fd = gzip.open(filepath_json, "r")
+        data = fd.read()
+        fd.close()
+
+        with connection:
+            upsert_day(connection, date, stamp, json.loads(data))
+        updated += 1
+
+    connection.close()
+    return updated
+
+
+def get_competition_names(connection):
+    """
+    Return the names of the competitions having matches
+    """
+
+    rows = connection.execute("SELECT DISTINCT competition FROM matches")
+    return set(row[0] for row in rows)
+
+
+def get_competition_stamp(connection, name):
+    """
+    Return a value that changes when the matches of a competition change
+    """
+
+    row = connection.execute("SELECT COUNT(*), MAX(id) FROM matches WHERE competition = ?", (name,)).fetchone()  # noqa: E501
+    return list(row)
+
+
+def get_competition_levels(connection, name):
+    """
+    Return the levels of a competition, ordered by their first match
+    """
+
+    rows = connection.execute("SELECT level FROM matches WHERE competition = ? GROUP BY level ORDER BY MIN(date || printf('%06d', position))", (name,))  # noqa: E501
+    return [row[0] for row in rows]
+
+
+def load_level(connection, name, level):
+    """
+    Return the matches of a competition level, in the same layout as the
+    competitions JSON files
+    """
+
+    goals = {}
+    for match_id, team, scorer, time, goal_type in connection.execute("SELECT goals.match_id, goals.team, goals.scorer, goals.time, goals.type FROM goals JOIN matches ON matches.id = goals.match_id WHERE matches.competition = ? AND matches.level = ? ORDER BY goals.match_id, goals.team, goals.position", (name, level)):  # noqa: E501
+        goals[(match_id, team)] = goals.get((match_id, team), [])
+        goals[(match_id, team)] += [[scorer, time, goal_type]]
+
+    matches = []
+    for row in connection.execute("SELECT matches.id, sport, date, t1.name, t1.logo, t2.name, t2.logo, score1, score2, rank1, rank2 FROM matches JOIN teams AS t1 ON t1.id = team1_id JOIN teams AS t2 ON t2.id = team2_id WHERE competition = ? AND level = ? ORDER BY date, position", (name, level)):  # noqa: E501
+        match_id, sport, date = row[:3]
+        matches += [{"sport": sport,
+                     "date": date,
+                     "competition": {"name": name, "level": level},
+                     "teams": [{"team1": {"name": row[3], "logo": row[4]}, "score": row[7],  # noqa: E501
+                                "rank": row[9], "goals": goals.get((match_id, 0), [])},  # noqa: E501
+                               {"team2": {"name": row[5], "logo": row[6]}, "score": row[8],  # noqa: E501
+                                "rank": row[10], "goals": goals.get((match_id, 1), [])}],  # noqa: E501
+                     }]
+    return matches
+
+
+def load_competition(connection, name):
+    """
+    Return the matches of a competition grouped by level, in the same layout
+    as the competitions JSON files
+    """
+
+    return [load_level(connection, name, level)
+            for level in get_competition_levels(connection, name)]
+
+
+def get_logo_urls(connection, names):
+    """
+    Return the logos URL of the teams that played in the competitions
+    """
+
+    urls = set()
+    for name in names:
+        for row in connection.execute("SELECT t.logo FROM teams AS t JOIN matches AS m ON t.id = m.team1_id OR t.id = m.team2_id WHERE m.competition = ?", (name,)):  # noqa: E501
+            urls.add(row[0])
+    return urls
+
+
+def get_competition_days(connection):
+    """
+    Return the number of days and matches stored for each competition
+    """
+
+    rows = connection.execute("SELECT competition, COUNT(DISTINCT date), COUNT(*) FROM matches GROUP BY competition")  # noqa: E501
+    return {name: (days, matches) for name, days, matches in rows}
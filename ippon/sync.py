@@ -1,20 +1,64 @@
 # SPDX-License-Identifier: GPL-2.0+
 # Guillaume Valadon <guillaume@valadon.net>
 
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import gzip
-import hashlib
+from itertools import repeat
 import json
 import os
 import re
 import requests
 import sys
 
+from ippon.archive import get_archive, get_retrieved_dates, pack_directory
 from ippon.config import init_config, StaticConfiguration, \
                          get_config_competitions
-from ippon.utils import get_competitions_dates, get_all_dates
+from ippon.fetch import FetchEngine, FetchError
+from ippon.journal import Journal
+from ippon.logos import collect_logo_urls, download_logos, \
+                        normalize_logos, build_atlas
+from ippon.manifest import load_manifest, locked_manifest, get_file_stamp, \
+                           add_manifest_dates
+from ippon.profile import span, count
+from ippon.goals import Scorers, normalize_match
+from ippon.records import get_competition_filepath, write_records_atomic, \
+                          RECORDS_VERSION
+from ippon.snapshot import write_snapshot
+from ippon.standings import get_standings_filepath, update_standings
+from ippon.store import update_store
+from ippon.utils import get_planned_dates, gzip_write_atomic
+
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer, Tag
+
+
+# Regular expressions used while parsing scores
+GOAL_TYPE_RE = re.compile(r"\((\w+)\)")
+GOAL_SCORER_RE = re.compile(r"((\s?([A-ZÀ-Ÿ]([a-zA-Z\.\-À-ÿ\'])+))+)")
+GOAL_TIME_RE = re.compile(r"(\d+’( \+\d+)?)")
+SPACES_RE = re.compile(r"\s+")
+NUMBER_RE = re.compile(r"(\d+)")
+TEAM_NAME_RE = re.compile(r"([a-zA-Z]+(\W[a-zA-Z]+)*)")
+COMPETITION_LEVEL_RE = re.compile(r"(([\w]+,?\s?)+)")
+
+# Supported BeautifulSoup tree builders
+PARSERS = ["html.parser", "lxml"]
+
+
+def index_divs(tag):
+    """
+    Map the classes of the divs below tag to the first div using them
+    """
 
-from bs4 import BeautifulSoup, Tag
+    divs = {}
+    for div in tag.find_all("div"):
+        classes = div.get("class")
+        if not classes:
+            continue
+        divs.setdefault(" ".join(classes), div)
+        for name in classes:
+            divs.setdefault(name, div)
+    return divs
 
 
 class Lequipe(object):
@@ -34,66 +78,118 @@ class Lequipe(object):
     content = None
     date = None
 
-    def __init__(self, directory_data):
+    def __init__(self, directory_data, engine=None, parser="html.parser",
+                 archive=False):
         self.directory_data = directory_data
         self.sport = "Football"
+        self.engine = engine
+        self.parser = parser
+        self.archive = archive
 
     def retrieve(self, date):
         """
-        Retrieve raw results
+        Retrieve raw results, and return False if they did not change
         """
         url = f"https://www.lequipe.fr/{self.sport}/Directs/{date}"
-        self.content = requests.get(url, headers=self.headers).content
+        with span("sync.fetch"):
+            if self.engine:
+                r = self.engine.get(url)
+            else:
+                r = requests.get(url, headers=self.headers)
+
+        # Error and throttling pages must not be stored as raw scores
+        if r.status_code != 200 or not r.content:
+            raise FetchError(f"HTTP {r.status_code}")
+        self.content = r.content
         self.date = date
-
-        fd = gzip.open(f"{self.directory_data}/{self.date}.{self.sport}.html.gz", "w")  # noqa: E501
-        fd.write(self.content)
-        fd.close()
+        count("sync.pages")
+        count("sync.bytes", len(self.content))
+
+        # Refreshed pages that did not change are not written again
+        if self.read(date) == self.content:
+            count("sync.unchanged")
+            return False
+
+        filename = f"{self.directory_data}/{self.date}.{self.sport}.html.gz"
+        with span("sync.write"):
+            if self.archive:
+                get_archive(self.directory_data, self.sport).append(date, self.content)  # noqa: E501
+                # The archive now holds the most recent page
+                if os.path.exists(filename):
+                    os.remove(filename)
+            else:
+                gzip_write_atomic(filename, self.content)
+        return True
 
     def exists(self, date):
         filename = f"{self.directory_data}/{date}.{self.sport}.html.gz"
-        return os.path.exists(filename)
+        if os.path.exists(filename):
+            return True
+        return get_archive(self.directory_data, self.sport).exists(date)
 
-    def load(self, date):
+    def read(self, date):
         """
-        Load raw results from disk
+        Return the stored raw results, from disk or from the archive of the
+        year, or None
         """
-        if self.exists(date):
-            filename = f"{self.directory_data}/{date}.{self.sport}.html.gz"
+        filename = f"{self.directory_data}/{date}.{self.sport}.html.gz"
+        if os.path.exists(filename):
             fd = gzip.open(filename, "r")
-            self.content = fd.read()
-            self.date = date
+            content = fd.read()
             fd.close()
+            return content
+        return get_archive(self.directory_data, self.sport).read(date)
+
+    def load(self, date):
+        """
+        Load raw results from disk, or from the archive of the year
+        """
+        content = self.read(date)
+        if content is not None:
+            self.content = content
+            self.date = date
 
     def _football_extract_goal(self, goals_text):
         # Goal type
         goal_type = None
-        p = re.compile(r"\((\w+)\)")
-        m = p.search(goals_text)
+        m = GOAL_TYPE_RE.search(goals_text)
         if m:
             goal_type = m.group(1)
 
         # Scorer name
         goal_scorer = None
-        p = re.compile(r"((\s?([A-ZÀ-Ÿ]([a-zA-Z\.\-À-ÿ\'])+))+)")
-        m = p.search(goals_text)
+        m = GOAL_SCORER_RE.search(goals_text)
         if m:
             goal_scorer = m.group(0)
 
         # Goal time
         goal_time = None
-        p = re.compile(r"(\d+’( \+\d+)?)")
-        m = p.search(goals_text)
+        m = GOAL_TIME_RE.search(goals_text)
         if m:
             goal_time = m.group(0)
 
         return (goal_scorer, goal_time, goal_type)
 
+    def get_competitions_names(self):
+        """
+        Return the names of the competitions listed in the scores sections
+        """
+
+        if self.content is None:
+            return set()
+        sections = SoupStrainer("div", class_="Lives__section")
+        soup = BeautifulSoup(self.content, self.parser, parse_only=sections)
+        return set(title.text for title
+                   in soup.find_all("h3", class_="Lives__title"))
+
     def parse(self):
         competitions = []
         if self.content is None:
             return competitions
-        soup = BeautifulSoup(self.content, "html.parser")
+
+        # Only build the tree of the sections containing scores
+        sections = SoupStrainer("div", class_="Lives__section")
+        soup = BeautifulSoup(self.content, self.parser, parse_only=sections)
 
         for live in soup.find_all("div", class_="Lives__section"):
             for competition in live.find_all("div", class_="Lives__compet"):
@@ -117,14 +213,16 @@ class Lequipe(object):
                         if not type(team_score) is Tag:
                             continue
 
+                        divs = index_divs(team_score)
+
                         # Extract goals
                         team1_goals = []
                         team2_goals = []
                         if self.sport == "Football":
-                            tmp_team1_goals = team_score.find("div", class_="TeamScore__goalList is-home")  # noqa: E501
+                            tmp_team1_goals = divs.get("TeamScore__goalList is-home")  # noqa: E501
                             if not tmp_team1_goals:
                                 continue
-                            tmp_team2_goals = team_score.find("div", class_="TeamScore__goalList is-away")  # noqa: E501
+                            tmp_team2_goals = divs.get("TeamScore__goalList is-away")  # noqa: E501
                             if not tmp_team2_goals:
                                 continue
 
@@ -139,20 +237,20 @@ class Lequipe(object):
                                     team2_goals += [tmp_goal]
 
                         # Extract team names
-                        team1 = team_score.find("div", class_="MatchScore__team MatchScore__home")  # noqa: E501
+                        team1 = divs.get("MatchScore__team MatchScore__home")
                         if not team1:
                             continue
-                        team2 = team_score.find("div", class_="MatchScore__team MatchScore__away")  # noqa: E501
+                        team2 = divs.get("MatchScore__team MatchScore__away")
                         if not team2:
                             continue
-                        team1_name = re.sub("\s+", " ", team1.find("div", class_="MatchScore__teamName").text)  # noqa: E501,W605
-                        team2_name = re.sub("\s+", " ", team2.find("div", class_="MatchScore__teamName").text)  # noqa: E501,W605
+                        team1_name = SPACES_RE.sub(" ", team1.find("div", class_="MatchScore__teamName").text)  # noqa: E501
+                        team2_name = SPACES_RE.sub(" ", team2.find("div", class_="MatchScore__teamName").text)  # noqa: E501
 
                         # Extract team logos div
-                        team1_logo = team_score.find("div", class_="MatchScore__logo--home")  # noqa: E501
+                        team1_logo = divs.get("MatchScore__logo--home")
                         if not team1_logo:
                             continue
-                        team2_logo = team_score.find("div", class_="MatchScore__logo--away")  # noqa: E501
+                        team2_logo = divs.get("MatchScore__logo--away")
                         if not team2_logo:
                             continue
 
@@ -177,15 +275,14 @@ class Lequipe(object):
                                 if not team_score:
                                     continue
 
-                                tmp = re.sub("\s+", " ", team_score.text)  # GV: test the returned value  # noqa: E501,W605
+                                tmp = SPACES_RE.sub(" ", team_score.text)  # GV: test the returned value  # noqa: E501
                                 team_scores.append(tmp)
 
                         # Process team ranks
                         team_ranks = [team1_name, team2_name]
                         if '(' in team1_name:
                             for i in range(len(team_ranks)):
-                                p = re.compile(r"(\d+)")
-                                m = p.search(team_ranks[i])
+                                m = NUMBER_RE.search(team_ranks[i])
                                 if m:
                                     team_ranks[i] = int(m.group(0))
                         else:
@@ -194,21 +291,18 @@ class Lequipe(object):
                         # Process team names
                         teams = [team1_name, team2_name]
                         for i in range(len(teams)):
-                            p = re.compile(r"([a-zA-Z]+(\W[a-zA-Z]+)*)")
-                            m = p.search(teams[i])
+                            m = TEAM_NAME_RE.search(teams[i])
                             if m:
                                 teams[i] = m.group(0)
 
                         # Process teams scores
                         for i in range(len(team_scores)):
-                            p = re.compile(r"(\d+)")
-                            m = p.search(team_scores[i])
+                            m = NUMBER_RE.search(team_scores[i])
                             if m:
                                 team_scores[i] = int(m.group(0))
 
                         # Competition level
-                        p = re.compile(r"(([\w]+,?\s?)+)")
-                        m = p.search(competition_level)
+                        m = COMPETITION_LEVEL_RE.search(competition_level)
                         if m.groups():
                             competition_level = m.group(0)
 
@@ -224,7 +318,44 @@ class Lequipe(object):
         return competitions
 
 
-def sync_logic(max):
+def retrieve_dates(engine, dates, force=False, archive=False, journal=None):
+    """
+    Retrieve the raw scores of dates, and return the ones that changed
+    """
+
+    for year in set(date[:4] for date in dates):
+        directory = os.path.join(StaticConfiguration.config_data_raw_directory_path, year)  # noqa: E501
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def retrieve(date):
+        directory = os.path.join(StaticConfiguration.config_data_raw_directory_path, date[:4])  # noqa: E501
+        scores_source = Lequipe(directory, engine, archive=archive)
+        if not force and scores_source.exists(date):
+            if journal:
+                journal.record(date)
+            return False
+        print(f"[+] Retrieving {date}")
+        try:
+            changed = scores_source.retrieve(date)
+        except requests.RequestException as e:
+            print(f"[!] {date}: {e}", file=sys.stderr)
+            if journal:
+                journal.record(date, str(e) or type(e).__name__)
+            return False
+        if journal:
+            journal.record(date)
+        return changed
+
+    with span("sync.retrieve"):
+        dates_retrieved = sorted(date for date, retrieved
+                                 in engine.run(retrieve, dates) if retrieved)
+    count("sync.skipped", len(dates) - len(dates_retrieved))
+    add_manifest_dates("retrieved", dates_retrieved)
+    return dates_retrieved
+
+
+def sync_logic(max, jobs=1, rate=None, archive=False):
 
     try:
         config = init_config(StaticConfiguration.config_file_path)
@@ -233,48 +364,119 @@ def sync_logic(max):
               file=sys.stderr)
         return
 
-    max_start, max_end = get_competitions_dates(config)
-    today = datetime.today()
-    if today < max_end:
-        max_end = today
+    # Resume the interrupted backfill, or plan a new one
+    journal = Journal()
+    dates_needed = journal.pending()
+    if dates_needed:
+        print(f"[+] Resuming the backfill, {len(dates_needed)} days left")
+    else:
+        dates_needed = get_planned_dates(config)
+        dates_retrieved = get_retrieved_dates()
 
-    dates_needed = get_all_dates(max_start, max_end)
+        dates_needed = list(set(dates_needed) - set(dates_retrieved))
+        dates_needed.sort()
+        dates_needed = dates_needed[:max]
+        journal.start(dates_needed)
 
-    dates_retrieved = set()
-    for year in [max_start.year, max_end.year]:
-        directory = os.path.join(StaticConfiguration.config_data_raw_directory_path, f"{year}")  # noqa: E501
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+    engine = FetchEngine(jobs, rate, Lequipe.headers)
+    retrieve_dates(engine, dates_needed, archive=archive, journal=journal)
+    if not journal.pending():
+        journal.finish()
+
+
+def pack_logic():
+    """
+    Move raw scores files to the yearly archives, and drop the pages they
+    superseded
+    """
+
+    directory_path = StaticConfiguration.config_data_raw_directory_path
+    if not os.path.exists(directory_path):
+        return
+
+    for year in sorted(os.listdir(directory_path)):
+        directory = os.path.join(directory_path, year)
+        if not year.isdigit() or not os.path.isdir(directory):
             continue
-        for filename in os.listdir(directory):
-            if filename.endswith(".html.gz"):
-                date = filename.split(".")[0]
-                dates_retrieved.add(date)
+        packed, reclaimed = pack_directory(directory)
+        if packed or reclaimed:
+            print(f"[+] {year}: {packed} days packed, {reclaimed} bytes reclaimed")  # noqa: E501
 
-    dates_needed = list(set(dates_needed) - set(dates_retrieved))
 
-    years_needed = set()
-    for date in dates_needed:
-        years_needed.add(date[:4])
+def check_parser(parser):
+    """
+    Return True if the BeautifulSoup tree builder is available
+    """
+
+    try:
+        BeautifulSoup("", parser)
+    except FeatureNotFound:
+        print(f"{parser} parser is not available!", file=sys.stderr)
+        return False
+    return True
+
+
+def convert_date(date, parser="html.parser"):
+    """
+    Parse the raw scores of a day, and return them encoded as JSON
+    """
+
+    directory = os.path.join(StaticConfiguration.config_data_raw_directory_path,  # noqa: E501
+                             date[:4])
+    scores_source = Lequipe(directory, parser=parser)
+    with span("build.load"):
+        scores_source.load(date)
+    with span("build.parse"):
+        competitions = scores_source.parse()
+    if not len(competitions):
+        return date, None
+    with span("build.encode"):
+        return date, json.dumps(competitions).encode()
+
+
+def convert_dates(dates, jobs=1, parser="html.parser"):
+    """
+    Convert the raw scores of dates to JSON files
+    """
+
+    if jobs > 1 and len(dates) > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        chunksize = max(1, len(dates) // (jobs * 4))
+        results = executor.map(convert_date, dates, repeat(parser),
+                               chunksize=chunksize)
+    else:
+        executor = None
+        results = map(convert_date, dates, repeat(parser))
+
+    dates_parsed = []
+    for date, data in results:
+        dates_parsed.append(date)
+        count("build.pages")
+        if data is None:
+            continue
+        directory = os.path.join(StaticConfiguration.config_data_json_directory_path,  # noqa: E501
+                                 date[:4])
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        filepath_json = os.path.join(directory, f"{date}.Football.json.gz")  # noqa: E501
+        with span("build.write"):
+            gzip_write_atomic(filepath_json, data)
+        count("build.json_bytes", len(data))
 
-    dates_needed.sort()
+    if executor:
+        executor.shutdown()
 
-    for year in years_needed:
-        directory = os.path.join(StaticConfiguration.config_data_raw_directory_path, f"{year}")  # noqa: E501
-        for date in dates_needed[:max]:
-            if not date.startswith(year):
-                continue
-            scores_source = Lequipe(directory)
-            if not scores_source.exists(date):
-                print(f"[+] Retrieving {date}")
-                scores_source.retrieve(date)
+    add_manifest_dates("parsed", dates_parsed)
 
 
-def build_logic():
+def build_logic(jobs=1, parser="html.parser", sqlite=False):
     """
     Convert raw scores to JSON
     """
 
+    if not check_parser(parser):
+        return
+
     # Load the configuration
     try:
         config = init_config(StaticConfiguration.config_file_path)
@@ -283,78 +485,192 @@ def build_logic():
               file=sys.stderr)
         return
 
-    max_start, max_end = get_competitions_dates(config)
-    today = datetime.today()
-    if today < max_end:
-        max_end = today
-
-    dates_needed = get_all_dates(max_start, max_end)
+    dates_needed = get_planned_dates(config)
 
     # Convert raw scores to JSON
-    if dates_needed:
+    dates_retrieved = get_retrieved_dates()
+    dates_converted = []
+    for date in dates_needed:
+        year = date[:4]
+        filename_json = f"{date}.Football.json.gz"
+        filepath_json = os.path.join(StaticConfiguration.config_data_json_directory_path,  # noqa: E501
+                                     year, filename_json)
+        if date in dates_retrieved and not os.path.exists(filepath_json):
+            dates_converted.append(date)
+
+    if dates_converted:
         print("[+] Converting raw scores to JSON")
-        for date in dates_needed:
-            year = date[:4]
-            filename_html = f"{date}.Football.html.gz"
-            filename_json = f"{date}.Football.json.gz"
-            directory = os.path.join(StaticConfiguration.config_data_json_directory_path,  # noqa: E501
-                                     year)
-            filepath_json = os.path.join(directory, filename_json)
-            directory = os.path.join(StaticConfiguration.config_data_raw_directory_path,  # noqa: E501
-                                     year)
-            filepath_html = os.path.join(directory, filename_html)
-            if os.path.exists(filepath_html) and not os.path.exists(filepath_json):  # noqa: E501
-                scores_source = Lequipe(directory)
-                scores_source.load(date)
-                competitions = scores_source.parse()
-                if len(competitions):
-                    fd = gzip.open(filepath_json, "w")
-                    fd.write(json.dumps(competitions).encode())
-                    fd.close()
+        with span("build.convert"):
+            convert_dates(dates_converted, jobs, parser)
 
     # Build the competitions JSON files
-    competitions = get_config_competitions(config)
-    for competition in competitions:
-        name = competition["name"]
+    with span("build.aggregate"):
+        aggregate_competitions(config, dates_needed)
+
+    # Upsert the updated days in the SQLite store
+    if sqlite:
+        with span("build.store"):
+            updated = update_store(dates_needed)
+        print(f"[+] {updated} days stored in SQLite")
+
+
+def aggregate_competitions(config, dates_needed):
+    """
+    Build the competitions files, streaming the matches of each level
+    """
+
+    names = set(c["name"] for c in get_config_competitions(config))
+    manifest = load_manifest()
+    manifest_days = manifest.get("days", {})
+    manifest_competitions = manifest.get("competitions", {})
+
+    def get_day_filepath(date):
+        return os.path.join(StaticConfiguration.config_data_json_directory_path,  # noqa: E501
+                            date[:4], f"{date}.Football.json.gz")
+
+    # Only a few days are kept in memory while the files are written
+    @lru_cache(maxsize=8)
+    def load_day(date):
+        return load_day_matches(get_day_filepath(date))
+
+    # Index the levels of the days that changed since the last build
+    days = {}
+    days_updated = set()
+    for date in dates_needed:
+        stamp = get_file_stamp(get_day_filepath(date))
+        if stamp is None:
+            continue
+
+        entry = manifest_days.get(date)
+        if entry and entry["stamp"] == stamp and "levels" in entry:
+            days[date] = entry
+            count("build.aggregate.cache_hits")
+            continue
+
+        matches = load_day(date)
+        levels = {}
+        for name in matches:
+            levels[name] = list(dict.fromkeys(c["competition"]["level"]
+                                              for c in matches[name]))
+        days[date] = {"stamp": stamp, "competitions": sorted(matches),
+                      "levels": levels}
+        days_updated.add(date)
+
+    # Only rebuild competitions whose source days changed
+    competitions_days = {}
+    competitions_dirty = set()
+    for name in names:
+        name_days = [d for d in days if name in days[d]["competitions"]]
+        competitions_days[name] = name_days
+        competition_filepath = get_competition_filepath(name)
+        if not os.path.exists(competition_filepath) \
+           or manifest.get("records") != RECORDS_VERSION \
+           or not os.path.exists(get_standings_filepath(name)) \
+           or manifest_competitions.get(name) != name_days \
+           or any(d in days_updated for d in name_days):
+            competitions_dirty.add(name)
+
+    count("build.aggregate.competitions", len(competitions_dirty))
+    scorers = Scorers()
+    for name in sorted(competitions_dirty):
         print(f"[+] {name}")
-        competition_levels = {}
-        for date in dates_needed:
-            year = date[:4]
-            filename_json = f"{date}.Football.json.gz"
-            directory = os.path.join(StaticConfiguration.config_data_json_directory_path,  # noqa: E501
-                                     year)
-            filepath_json = os.path.join(directory, filename_json)
-
-            if not os.path.exists(filepath_json):
-                continue
-
-            fd = gzip.open(filepath_json, "r")
-            data = fd.read()
-            fd.close()
-            competitions = json.loads(data)
-            competitions = [c for c in competitions if c["competition"]["name"] == name]  # noqa: E501
 
-            for competition in competitions:
-                level = competition["competition"]["level"]
-                competition_levels[level] = competition_levels.get(level, [])
-                competition_levels[level] += [competition]
+        # Levels are sorted by their first day
+        levels_days = {}
+        for date in competitions_days[name]:
+            for level in days[date]["levels"][name]:
+                levels_days.setdefault(level, []).append(date)
+
+        def get_records(name=name, levels_days=levels_days):
+            for level, level_days in levels_days.items():
+                for date in level_days:
+                    for competition in load_day(date)[name]:
+                        if competition["competition"]["level"] == level:
+                            yield normalize_match(competition, scorers)
+
+        write_records_atomic(get_competition_filepath(name), get_records())
+
+        with span("build.standings"):
+            update_standings(name, levels_days, days, load_day)
+
+        # Remove the file of the previous format
+        legacy_filepath = os.path.join(StaticConfiguration.config_competitions_directory_path, f"{name}.json.gz")  # noqa: E501
+        if os.path.exists(legacy_filepath):
+            os.remove(legacy_filepath)
+
+    scorers.save()
+
+    with locked_manifest() as manifest:
+        manifest["days"] = days
+        manifest["competitions"] = competitions_days
+        manifest["records"] = RECORDS_VERSION
+
+    # Precompiled matches loaded by the viewer at startup
+    with span("build.snapshot"):
+        write_snapshot([c["name"] for c in get_config_competitions(config)])
+
+
+def load_day_matches(filepath_json):
+    """
+    Load the matches of a day, grouped by competition name
+    """
+
+    fd = gzip.open(filepath_json, "r")
+    data = fd.read()
+    fd.close()
+
+    matches = {}
+    competitions = json.loads(data)
+    count("build.matches", len(competitions))
+    for competition in competitions:
+        name = competition["competition"]["name"]
+        matches[name] = matches.get(name, [])
+        matches[name] += [competition]
+    return matches
+
+
+def parser_logic(parser, max):
+    """
+    Check that a parser backend extracts the same scores as html.parser
+    """
+
+    if not check_parser(parser):
+        return
+
+    try:
+        config = init_config(StaticConfiguration.config_file_path)
+    except FileNotFoundError:
+        print(f"{StaticConfiguration.config_file_path} not found!",
+              file=sys.stderr)
+        return
+
+    dates_needed = get_planned_dates(config)
 
-        competition_data = []
-        for level in competition_levels:
-            level_dates = [int(c["date"]) for c in competition_levels[level]]
-            level_dates.sort()
-            level_date = level_dates[0]
+    checked = 0
+    mismatches = 0
+    for date in dates_needed:
+        if max >= 0 and checked >= max:
+            break
+        directory = os.path.join(StaticConfiguration.config_data_raw_directory_path,  # noqa: E501
+                                 date[:4])
+        reference = Lequipe(directory)
+        if not reference.exists(date):
+            continue
+        reference.load(date)
+        candidate = Lequipe(directory, parser=parser)
+        candidate.content = reference.content
+        candidate.date = date
 
-            competition_data.append({"date": level_date, "data": competition_levels[level]})  # noqa: E501
+        checked += 1
+        if reference.parse() != candidate.parse():
+            mismatches += 1
+            print(f"[!] {date} differs", file=sys.stderr)
 
-        competition_filepath = os.path.join(StaticConfiguration.config_competitions_directory_path, f"{name}.json.gz")  # noqa: E501
-        competition_data = sorted(competition_data, key=lambda c: c["date"])
-        fd = gzip.open(competition_filepath, "w")
-        fd.write(json.dumps([e["data"] for e in competition_data]).encode())
-        fd.close()
+    print(f"[+] {checked} days checked, {mismatches} mismatches")
+    return mismatches == 0
 
 
-def logo_logic():
+def logo_logic(sqlite=False, jobs=1, rate=None, normalize=False):
     """
     Download logos
     """
@@ -367,28 +683,23 @@ def logo_logic():
               file=sys.stderr)
         return
 
-    competitions = get_config_competitions(config)
-    for competition in competitions:
-        name = competition["name"]
-        print(f"[+] {name}")
-        competition_filepath = os.path.join(StaticConfiguration.config_competitions_directory_path, f"{name}.json.gz")  # noqa: E501
-        if not os.path.exists(competition_filepath):
-            continue
-        fd = gzip.open(competition_filepath, "r")
-        data = fd.read()
-        fd.close()
-        competitions = json.loads(data)
-        for competition in competitions:
-            for match in competition:
-                for team in match["teams"]:
-                    for team_name in team:
-                        if team_name == "team1" or team_name == "team2":
-                            logo_url = team[team_name]["logo"]
-                            logo_filename = hashlib.md5(logo_url.encode()).hexdigest() + ".png"  # noqa: E501
-                            logo_filepath = os.path.join(StaticConfiguration.config_logos_directory_path, logo_filename)  # noqa: E501
-                            if not os.path.exists(logo_filepath):
-                                print(f"  [+] Downloading {logo_url}")
-                                r = requests.get(logo_url)
-                                fd = open(logo_filepath, "wb")
-                                fd.write(r.content)
-                                fd.close()
+    if normalize:
+        normalize_logos()
+
+    engine = FetchEngine(jobs, rate)
+    sync_logos(config, engine, sqlite)
+
+
+def sync_logos(config, engine, sqlite=False):
+    """
+    Download the logos of the teams of all competitions
+    """
+
+    with span("logo.collect"):
+        logo_urls = collect_logo_urls(config, sqlite)
+    print(f"[+] {len(logo_urls)} logos")
+    count("logo.urls", len(logo_urls))
+    with span("logo.download"):
+        download_logos(engine, logo_urls)
+    with span("logo.atlas"):
+        build_atlas()
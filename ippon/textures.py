@@ -0,0 +1,161 @@
+# SPDX-License-Identifier: GPL-2.0+
+# Guillaume Valadon <guillaume@valadon.net>
+
+from collections import OrderedDict
+import os
+import queue
+import threading
+
+from ippon.config import StaticConfiguration
+from ippon.logos import load_atlas_index, get_atlas_stamp
+
+from pyray import load_image, unload_image, load_texture_from_image, \
+    unload_texture, load_texture, Rectangle
+
+
+class TextureCache(object):
+    """
+    A bounded LRU cache of logo textures, fed by a background decoder
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.textures = OrderedDict()
+        self.images = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._decode, daemon=True)
+        self.thread.start()
+
+    def _decode(self):
+        """
+        Decode images in the background, textures are uploaded by the
+        render thread
+        """
+
+        while True:
+            filepath = self.queue.get()
+            if filepath is None:
+                break
+            image = load_image(filepath)
+            with self.lock:
+                self.images[filepath] = image
+                self.pending.discard(filepath)
+
+    def prefetch(self, filepaths):
+        """
+        Queue images that will soon be displayed
+        """
+
+        for filepath in filepaths:
+            if not filepath or filepath in self.textures:
+                continue
+            with self.lock:
+                if filepath in self.pending or filepath in self.images:
+                    continue
+                self.pending.add(filepath)
+            self.queue.put(filepath)
+
+    def upload(self):
+        """
+        Convert decoded images to textures, must be called by the render
+        thread
+        """
+
+        with self.lock:
+            images = self.images
+            self.images = {}
+
+        for filepath, image in images.items():
+            if filepath not in self.textures:
+                self._store(filepath, load_texture_from_image(image))
+            unload_image(image)
+
+    def get(self, filepath):
+        """
+        Return the texture of an image, decoding it now if needed
+        """
+
+        if not filepath:
+            return None
+
+        texture = self.textures.get(filepath)
+        if texture is not None:
+            self.textures.move_to_end(filepath)
+            return texture
+
+        self.upload()
+        texture = self.textures.get(filepath)
+        if texture is None:
+            image = load_image(filepath)
+            texture = load_texture_from_image(image)
+            unload_image(image)
+            self._store(filepath, texture)
+        return texture
+
+    def _store(self, filepath, texture):
+        self.textures[filepath] = texture
+        while len(self.textures) > self.size:
+            _, texture = self.textures.popitem(last=False)
+            unload_texture(texture)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.upload()
+        for texture in self.textures.values():
+            unload_texture(texture)
+        self.textures.clear()
+
+
+class TextureAtlas(object):
+    """
+    Logos packed by 'ippon logo', uploaded once as a few textures
+    """
+
+    def __init__(self):
+        self.textures = []
+        self.rectangles = {}
+        self.stamp = None
+
+    def load(self):
+        """
+        Load the atlas, or reload it if it was rebuilt, and return True when
+        it changed
+        """
+
+        stamp = get_atlas_stamp()
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+
+        self.unload()
+        index = load_atlas_index()
+        if index is None:
+            return True
+
+        for atlas_filename in index["atlases"]:
+            atlas_filepath = os.path.join(StaticConfiguration.config_atlas_directory_path, atlas_filename)  # noqa: E501
+            self.textures.append(load_texture(atlas_filepath))
+        for logo_hash, (atlas, x, y, width, height) in index["logos"].items():  # noqa: E501
+            self.rectangles[f"{logo_hash}.png"] = (atlas, Rectangle(x, y, width, height))  # noqa: E501
+        return True
+
+    def get(self, filepath):
+        """
+        Return the texture and rectangle of a logo, or None
+        """
+
+        if not filepath:
+            return None
+        entry = self.rectangles.get(os.path.basename(filepath))
+        if entry is None:
+            return None
+        return self.textures[entry[0]], entry[1]
+
+    def unload(self):
+        for texture in self.textures:
+            unload_texture(texture)
+        self.textures = []
+        self.rectangles = {}
@@ -2,6 +2,8 @@
 # Guillaume Valadon <guillaume@valadon.net>
 
 from datetime import datetime, timedelta
+import gzip
+import os
 
 from ippon.config import get_config_competitions
 
@@ -40,3 +42,67 @@ def get_all_dates(date_start, date_end):
         dates_needed.append(date)
 
     return dates_needed
+
+
+def get_competitions_intervals(config):
+    """
+    Return the union of the competitions dates, as sorted and disjoint
+    (start, end) intervals
+    """
+
+    intervals = []
+    for competition in get_config_competitions(config):
+        start = datetime.strptime(competition["start"], "%d/%m/%Y")
+        end = datetime.strptime(competition["end"], "%d/%m/%Y")
+        intervals.append((start, end))
+    intervals.sort()
+
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [(start, end) for start, end in merged]
+
+
+def get_planned_dates(config):
+    """
+    Return the dates, up to today, needed by at least one competition
+    """
+
+    dates_needed = []
+    for start, end in get_competitions_intervals(config):
+        dates_needed += get_all_dates(start, end)
+    return dates_needed
+
+
+def get_existing_dates(directory_path, suffix):
+    """
+    Return the dates of the files stored in all years of a data directory
+    """
+
+    dates = set()
+    if not os.path.exists(directory_path):
+        return dates
+    for year in os.listdir(directory_path):
+        directory = os.path.join(directory_path, year)
+        if not year.isdigit() or not os.path.isdir(directory):
+            continue
+        for filename in os.listdir(directory):
+            if filename.endswith(suffix):
+                dates.add(filename.split(".")[0])
+    return dates
+
+
+def gzip_write_atomic(filepath, data):
+    """
+    Write gzip compressed data to a temporary file, then move it in place
+    """
+
+    tmp_filepath = f"{filepath}.tmp"
+    fd = gzip.open(tmp_filepath, "w")
+    fd.write(data)
+    fd.close()
+    os.replace(tmp_filepath, filepath)
@@ -1,9 +1,6 @@
 # SPDX-License-Identifier: GPL-2.0+
 # Guillaume Valadon <guillaume@valadon.net>
 
-import gzip
-import hashlib
-import json
 import locale
 import os
 import sys
@@ -11,14 +8,46 @@ import time
 
 from ippon.config import init_config, StaticConfiguration, \
     get_config_competitions
+from ippon import logos
+from ippon.frames import FrameTimer, FRAME_PHASES
+from ippon.model import Scores, ScoresWatcher, JSONSource, SQLiteSource, \
+    RemoteSource
+from ippon.snapshot import load_snapshot, get_snapshot_names, SnapshotSource
+from ippon.textures import TextureCache, TextureAtlas
 
 from cffi import FFI
 from pyray import *
 
 
-def load_scores():
-
-    scores = {}
+LOGO_CACHE_SIZE = 64
+PREFETCH_GAMES = 3
+STANDINGS_ROWS = 20
+
+
+def load_scores(sqlite=False, server=None):
+
+    # Pull the competitions from an 'ippon serve' node
+    if server:
+        # Competitions added to the server are listed by reload()
+        try:
+            scores = Scores(None, RemoteSource(server))
+        except (OSError, ValueError) as e:
+            print(f"{server}: {e}", file=sys.stderr)
+            return
+        scores.preload()
+        if not scores.competitions:
+            print(f"{server}: no competitions available", file=sys.stderr)
+            return
+        return scores
+
+    # Start from the snapshot header written by build, competitions are only
+    # read from it when they are displayed
+    snapshot = None
+    if not sqlite:
+        snapshot = load_snapshot()
+        names = get_snapshot_names(snapshot)
+        if names is not None:
+            return Scores(names, SnapshotSource(snapshot))
 
     # Load the configuration
     try:
@@ -28,33 +57,139 @@ def load_scores():
               file=sys.stderr)
         return
 
-    competitions = get_config_competitions(config)
-    for competition in competitions:
-        name = competition["name"]
-        competition_filepath = os.path.join(StaticConfiguration.config_competitions_directory_path, f"{name}.json.gz")  # noqa: E501
-        if not os.path.exists(competition_filepath):
-            continue
-        fd = gzip.open(competition_filepath, "r")
-        data = fd.read()
-        fd.close()
+    names = [c["name"] for c in get_config_competitions(config)]
+    if sqlite:
+        return Scores(names, SQLiteSource())
+
+    # Stale snapshots are rebuilt by build, their unchanged competitions are
+    # still used
+    if snapshot is not None:
+        return Scores(names, SnapshotSource(snapshot))
+
+    # Competitions are only decompressed when they are displayed
+    return Scores(names, JSONSource())
+
+
+def get_logo_filepath(logo_url):
+    """
+    Return the path of a downloaded logo, or None
+    """
+
+    logo_filepath = logos.get_logo_filepath(logo_url)
+    if os.path.exists(logo_filepath):
+        return logo_filepath
+    return None
+
+
+class GameView(object):
+    """
+    Texts, positions and logos of a game, computed once when it is displayed
+    """
+
+    __slots__ = ("game", "texts", "logo1_filepath", "logo2_filepath",
+                 "logo1_atlas", "logo2_atlas", "logo1_position",
+                 "logo2_position")
+
+    def __init__(self, game, font_size, atlas):
+        self.game = game
+        top = int(480 / 4)
+
+        score = "%+3s - %-3s" % (game.score1, game.score2)
+        x = measure_text(score, font_size)
+        team1_len = measure_text(game.team1, font_size)
+        team2_len = measure_text(game.team2, font_size)
 
-        scores[name] = scores.get(name, {})
-        for games in json.loads(data):
-            for game in games:
-                level = game["competition"]["level"]
-                scores[name][level] = scores[name].get(level, []) + [game["teams"]]  # noqa: E501
+        self.texts = [(score, 400 - int(x / 2), top, font_size),
+                      (game.team1, 400 - int(x / 2) - team1_len - 20, top, font_size),  # noqa: E501
+                      (game.team2, 400 + int(x / 2) + 20, top, font_size)]
 
-    return scores
+        for i, goal in enumerate(game.labels1):
+            goal_len = measure_text(goal, 20)
+            self.texts.append((goal, 400 - int(x / 2) - goal_len - 20,
+                               top + font_size + font_size * (i + 1), 20))
+
+        for i, goal in enumerate(game.labels2):
+            self.texts.append((goal, 400 + int(x / 2) + 20,
+                               top + font_size + font_size * (i + 1), 20))
+
+        self.logo1_filepath = get_logo_filepath(game.logo1)
+        self.logo2_filepath = get_logo_filepath(game.logo2)
+        self.logo1_atlas = atlas.get(self.logo1_filepath)
+        self.logo2_atlas = atlas.get(self.logo2_filepath)
+        self.logo1_position = (400 - int(x / 2) - team1_len - 20 - 40, top)
+        self.logo2_position = (400 + int(x / 2) + team2_len + 40, top)
 
 
 def draw_date_time():
-    locale.setlocale(locale.LC_TIME, "fr_FR")
     draw_text(time.strftime("%a %d %b %Y %H:%M:%S", time.localtime()), 800 - 300, 480 - 40, 20, BLACK)  # noqa: E501
 
 
-def window_logic():
+def draw_logo(atlas_entry, filepath, position, textures):
+    if atlas_entry:
+        draw_texture_rec(*atlas_entry, Vector2(*position), WHITE)
+        return
+    texture = textures.get(filepath)
+    if texture:
+        draw_texture(texture, *position, WHITE)
+
+
+def draw_standings(rows):
+    """
+    Draw the league table after the selected level
+    """
+
+    if not rows:
+        draw_text("No standings", 400 - int(measure_text("No standings", 20) / 2), 200, 20, GRAY)  # noqa: E501
+        return
+
+    top = 60
+    for text, x in [("P", 420), ("GD", 470), ("Pts", 530), ("Form", 600)]:
+        draw_text(text, x, top, 16, GRAY)
+    for i, row in enumerate(rows[:STANDINGS_ROWS]):
+        y = top + 18 * (i + 1)
+        draw_text("%2d" % (i + 1), 40, y, 16, GRAY)
+        draw_text(row["team"], 70, y, 16, BLACK)
+        draw_text("%d" % row["played"], 420, y, 16, BLACK)
+        draw_text("%+d" % row["goal_difference"], 470, y, 16, BLACK)
+        draw_text("%d" % row["points"], 530, y, 16, BLACK)
+        draw_text(row["form"], 600, y, 16, BLACK)
+
+
+def draw_hud(timer):
+    """
+    Draw the phases of the previous frame, and the worst frames history
+    """
+
+    if timer.previous is None:
+        return
+
+    work, phases = timer.previous
+    x, y = 20, 330
+    draw_rectangle(x - 10, y - 10, 230, 140, Color(245, 245, 245, 220))
+    draw_text("work     %6.2f ms" % (work * 1000), x, y, 10, DARKGRAY)
+    for i, phase in enumerate(FRAME_PHASES):
+        draw_text("%-8s %6.2f ms" % (phase, phases[phase] * 1000),
+                  x, y + 12 * (i + 1), 10, DARKGRAY)
+
+    # One bar per window, 2 pixels per millisecond
+    for i, (worst, _) in enumerate(timer.worst):
+        height = max(1, min(40, int(worst * 2000)))
+        draw_rectangle(x + i * 7, y + 120 - height, 5, height, RED)
+
+
+def window_logic(sqlite=False, reload_interval=60, hud=False, frames=0,
+                 server=None):
 
-    all_scores = load_scores()
+    all_scores = load_scores(sqlite, server)
+    if all_scores is None:
+        return
+    if frames > 0:
+        # Render benchmark, data must not change while it runs
+        reload_interval = 0
+    scores_version = all_scores.version
+    watcher = ScoresWatcher(all_scores, reload_interval)
+    atlas_version = watcher.atlas_version
+    watcher.start()
 
     DRAW_GRID = False
     ROTATE_TIME = time.time()
@@ -62,6 +197,15 @@ def window_logic():
 
     ffi = FFI()
 
+    DRAW_HUD = hud
+    DRAW_STANDINGS = False
+    # Standings of the competitions, tables are memoized per level
+    standings = {}
+    timer = FrameTimer(keep_all=frames > 0)
+    frame_count = 0
+
+    if frames > 0:
+        set_config_flags(FLAG_WINDOW_HIDDEN)
     init_window(800, 480, "ippon")
 
     FONT_SIZE = 30
@@ -76,16 +220,33 @@ def window_logic():
 
     game_id = ffi.new("int *")
 
-    current_team1_logo = None
-    current_team2_logo = None
-    current_team1_texture = None
-    current_team2_texture = None
+    textures = TextureCache(LOGO_CACHE_SIZE)
+    prefetched_game = None
+    atlas = TextureAtlas()
+    atlas.load()
+
+    # Values that only change when the selection changes
+    competitions_keys = list(all_scores.keys())
+    competitions_str = ";".join(competitions_keys)
+    days_keys_games = None
+    days_keys = []
+    days_str_cache_key = None
+    days_str = ""
+    game_view = None
 
     set_trace_log_level(LOG_NONE)
+    locale.setlocale(locale.LC_TIME, "fr_FR")
 
     while not window_should_close():
+        if frames > 0:
+            if frame_count >= frames:
+                break
+            frame_count += 1
+
+        timer.begin()
         begin_drawing()
-        set_target_fps(10)
+        # The benchmark renders as fast as possible
+        set_target_fps(0 if frames > 0 else 10)
 
         if is_key_pressed(KEY_F):
             toggle_fullscreen()
@@ -93,6 +254,12 @@ def window_logic():
         if is_key_pressed(KEY_D):
             DRAW_GRID = ~DRAW_GRID
 
+        if is_key_pressed(KEY_H):
+            DRAW_HUD = not DRAW_HUD
+
+        if is_key_pressed(KEY_S):
+            DRAW_STANDINGS = not DRAW_STANDINGS
+
         clear_background(WHITE)
 
         if is_mouse_button_pressed(MOUSE_BUTTON_LEFT):
@@ -107,122 +274,112 @@ def window_logic():
 
             for i in range(0, 800, 10):
                 draw_line(i, 0, i, 480, GRAY)
+        timer.mark("text")
+
+        # Swap in competitions reloaded in the background, and keep the
+        # current selection
+        if scores_version != all_scores.version:
+            scores_version = all_scores.version
+            competition_key = competitions_keys[value[0]]
+            day_key = days_keys[day_value] if days_keys else None
+            competitions_keys = list(all_scores.keys())
+            competitions_str = ";".join(competitions_keys)
+            if competition_key in competitions_keys:
+                value[0] = competitions_keys.index(competition_key)
+            else:
+                value[0] = 0
+            days_keys = list(all_scores[competitions_keys[value[0]]].keys())
+            days_keys_games = all_scores[competitions_keys[value[0]]]
+            days_str_cache_key = None
+            day_value = days_keys.index(day_key) if day_key in days_keys else 0  # noqa: E501
+            game_view = None
+            standings = {}
+
+        # Upload the atlas rebuilt by 'ippon logo' or the daemon
+        if atlas_version != watcher.atlas_version:
+            atlas_version = watcher.atlas_version
+            if atlas.load():
+                game_view = None
 
-        competitions_keys = [c for c in all_scores.keys()]
         competition_key = competitions_keys[value[0]]
         games = all_scores[competition_key]
-        day_key = [d for d in all_scores[competition_key].keys()][day_value]
-
-        if False:
-            print(value[0], "-", competition_key, "|", day_value[0], "-", day_key, "|", game_id[0], "-", len(games[day_key]))  # noqa: E501
+        if days_keys_games is not games:
+            days_keys_games = games
+            days_keys = list(games.keys())
+        day_key = days_keys[day_value]
+        game_id[0] = min(game_id[0], len(games[day_key]))
+        timer.mark("lookup")
 
         gui_spinner(Rectangle(20 + 200 + 20 + 200 + 20, 20, 200, BOX_HEIGHT),
                     "%d " % len(games[day_key]), game_id, 1,
                     len(games[day_key]), False)
+        timer.mark("gui")
 
-        if (time.time() - ROTATE_TIME) > ROTATE_DELAY:
+        if frames > 0:
+            # Go through every game of every day of every competition
+            game_id[0] += 1
+            if game_id[0] > len(games[day_key]):
+                game_id[0] = 1
+                day_value += 1
+                if day_value >= len(days_keys):
+                    day_value = 0
+                    value[0] = (value[0] + 1) % len(competitions_keys)
+                    competition_key = competitions_keys[value[0]]
+                    games = all_scores[competition_key]
+                    days_keys_games = games
+                    days_keys = list(games.keys())
+                day_key = days_keys[day_value]
+        elif (time.time() - ROTATE_TIME) > ROTATE_DELAY:
             ROTATE_TIME = time.time()
             game_id[0] += 1
             game_id[0] %= len(games[day_key])
 
-        # Retrieve game information
-        team1 = games[day_key][game_id[0] - 1][0]["team1"]["name"]
-        team2 = games[day_key][game_id[0] - 1][1]["team2"]["name"]
-
-        team1_score = games[day_key][game_id[0] - 1][0]["score"]
-        team2_score = games[day_key][game_id[0] - 1][1]["score"]
-
-        team1_logo = games[day_key][game_id[0] - 1][0]["team1"]["logo"]
-        team2_logo = games[day_key][game_id[0] - 1][1]["team2"]["logo"]
-
-        logo_filename = hashlib.md5(team1_logo.encode()).hexdigest() + ".png"  # noqa: E501
-        logo_filepath = os.path.join(StaticConfiguration.config_logos_directory_path, logo_filename)  # noqa: E501
-        if os.path.exists(logo_filepath):
-            team1_logo = logo_filepath
-        else:
-            team1_logo = None
-        logo_filename = hashlib.md5(team2_logo.encode()).hexdigest() + ".png"  # noqa: E501
-        logo_filepath = os.path.join(StaticConfiguration.config_logos_directory_path, logo_filename)  # noqa: E501
-        if os.path.exists(logo_filepath):
-            team2_logo = logo_filepath
+        # Only compute the game layout when the displayed game changes
+        game = games[day_key][game_id[0] - 1]
+        if game_view is None or game_view.game is not game:
+            game_view = GameView(game, FONT_SIZE, atlas)
+        timer.mark("lookup")
+
+        if DRAW_STANDINGS:
+            if competition_key not in standings:
+                standings[competition_key] = all_scores.source.load_standings(competition_key)  # noqa: E501
+            rows = None
+            if standings[competition_key]:
+                rows = standings[competition_key].get_rows(day_key)
+            timer.mark("lookup")
+            draw_standings(rows)
         else:
-            team2_logo = None
-
-        team1_goals = []
-        for goal in games[day_key][game_id[0] - 1][0]["goals"]:
-            goal_type = ""
-            if goal[2]:
-                goal_type = " " + goal[2]
-            goal[1] = goal[1].replace("’", "'")
-            team1_goals.append(goal[0] + " " + goal[1] + goal_type)
-
-        team2_goals = []
-        for goal in games[day_key][game_id[0] - 1][1]["goals"]:
-            goal_type = ""
-            if goal[2]:
-                goal_type = " " + goal[2]
-            goal[1] = goal[1].replace("’", "'")
-            team2_goals.append(goal[0] + " " + goal[1] + goal_type)
-
-        x = measure_text("%+3s - %-3s" % (team1_score, team2_score),
-                         FONT_SIZE)
-        draw_text("%+3s - %-3s" % (team1_score, team2_score),
-                  400 - int(x / 2), int(480 / 4),
-                  FONT_SIZE, BLACK)
-
-        team1_len = measure_text(team1, FONT_SIZE)
-        draw_text(team1, 400 - int(x / 2) - team1_len - 20,
-                  int(480 / 4), FONT_SIZE, BLACK)
-
-        if current_team1_logo != team1_logo:
-            if current_team1_texture:
-                unload_texture(current_team1_texture)
-            current_team1_logo = team1_logo
-            team1_logo = load_image(team1_logo)
-            current_team1_texture = load_texture_from_image(team1_logo)
-        if current_team1_texture:
-            draw_texture(current_team1_texture,
-                         400 - int(x / 2) - team1_len - 20 - 40,
-                         int(480 / 4), WHITE)
-
-        y = measure_text(team2, FONT_SIZE)
-        draw_text(team2, 400 + int(x / 2) + 20, int(480 / 4),
-                  FONT_SIZE, BLACK)
-
-        if current_team2_logo != team2_logo:
-            if current_team2_texture:
-                unload_texture(current_team2_texture)
-            current_team2_logo = team2_logo
-            team2_logo = load_image(team2_logo)
-            current_team2_texture = load_texture_from_image(team2_logo)
-        if current_team2_texture:
-            draw_texture(current_team2_texture, 400 + int(x / 2) + y + 40,
-                         int(480 / 4), WHITE)
-
-        for i in range(len(team1_goals)):
-            goal_len = measure_text(team1_goals[i], 20)
-            draw_text(team1_goals[i], 400 - int(x / 2) - goal_len - 20,
-                      int(480 / 4) + FONT_SIZE + FONT_SIZE * (i + 1),
-                      20, BLACK)
-
-        for i in range(len(team2_goals)):
-            goal_len = measure_text(team2_goals[i], 20)
-            draw_text(team2_goals[i],
-                      400 + int(x / 2) + 20, int(480 / 4) + FONT_SIZE + FONT_SIZE * (i + 1),  # noqa: E501
-                      20, BLACK)
+            for text, text_x, text_y, text_size in game_view.texts:
+                draw_text(text, text_x, text_y, text_size, BLACK)
+        timer.mark("text")
+
+        # Decode the logos of the next games that are not in the atlas
+        if prefetched_game is not game:
+            prefetched_game = game
+            day_games = games[day_key]
+            for i in range(PREFETCH_GAMES):
+                next_game = day_games[(game_id[0] + i) % len(day_games)]
+                textures.prefetch([f for f in [get_logo_filepath(next_game.logo1),  # noqa: E501
+                                               get_logo_filepath(next_game.logo2)]  # noqa: E501
+                                   if not atlas.get(f)])
+        textures.upload()
+
+        # Logos are not drawn with the standings
+        if not DRAW_STANDINGS:
+            draw_logo(game_view.logo1_atlas, game_view.logo1_filepath,
+                      game_view.logo1_position, textures)
+            draw_logo(game_view.logo2_atlas, game_view.logo2_filepath,
+                      game_view.logo2_position, textures)
+        timer.mark("texture")
 
         draw_date_time()
+        timer.mark("text")
 
         # Draw the competitions dropdown box
-        competitions_str = ";".join(c for c in all_scores.keys())
         if gui_dropdown_box(Rectangle(20, 20, 200, BOX_HEIGHT), competitions_str, value, edit_box):  # noqa: E501
             edit_box = not edit_box
             game_id[0] = 0
 
-        # Draw the days dropdown box
-        competitions_keys = [c for c in all_scores.keys()]
-        competition_key = competitions_keys[value[0]]
-
         # Adjust the dropbox view
         tmp_day_value = day_value
         if tmp_day_value < 5:
@@ -231,11 +388,32 @@ def window_logic():
         max_day_value_dropbox = tmp_day_value + 4
         day_value_dropbox[0] = day_value - min_day_value_dropbox
 
-        days_str = ";".join([c for c in all_scores[competition_key].keys()][min_day_value_dropbox:max_day_value_dropbox])  # noqa: E501
+        # Draw the days dropdown box
+        days_str_key = (competition_key, min_day_value_dropbox)
+        if days_str_cache_key != days_str_key:
+            days_str_cache_key = days_str_key
+            days_str = ";".join(days_keys[min_day_value_dropbox:max_day_value_dropbox])  # noqa: E501
         if gui_dropdown_box(Rectangle(20 + 200 + 20, 20, 200, BOX_HEIGHT), days_str, day_value_dropbox, day_edit_box):  # noqa: E501
             day_edit_box = not day_edit_box
             day_value = min_day_value_dropbox + day_value_dropbox[0]
+        timer.mark("gui")
+
+        if DRAW_HUD:
+            draw_hud(timer)
+            timer.mark("text")
 
         end_drawing()
+        timer.end()
 
+    watcher.stop()
+    textures.close()
+    atlas.unload()
     close_window()
+
+    if frames > 0:
+        report = timer.report()
+        print(f"[+] {report['frames']} frames")
+        for name in ["frame", "work"] + list(FRAME_PHASES):
+            print("    %-8s p50 %7.3f ms  p90 %7.3f ms  p99 %7.3f ms  max %7.3f ms"  # noqa: E501
+                  % (name, report[name]["p50"], report[name]["p90"],
+                     report[name]["p99"], report[name]["max"]))
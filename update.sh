@@ -3,5 +3,3 @@ source /home/ippon/ippon.git/.venv/bin/activate
 ippon sync
 ippon logo
 ippon build
-sudo killall -9 ippon
-ippon view &